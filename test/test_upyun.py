@@ -1,11 +1,31 @@
+import base64
+import calendar
 import datetime
+import email.utils
+import hashlib
+import json
 import os.path
+import pickle
+import shutil
+import StringIO
+import tempfile
+import threading
+import time
 import unittest
 from urllib import pathname2url
 
 import pytest
+import requests
 
-from upyun import const, UpYun
+from upyun import bench, const, UpYun
+from upyun.auth import http_date, UpYunDigestAuthentication
+from upyun.bulk import Bulk
+from upyun.cache import ContentCache, MetadataCache
+from upyun.fakeserver import FakeUpYun
+from upyun.hosts import HostSelector
+from upyun.metrics import Histogram, StatsdSink
+from upyun.retry import DeadlineExceeded, RetryBudget, RetryPolicy
+from upyun.transport import PoolAdapter, request_timeout
 
 
 class UpYunTestCase(unittest.TestCase):
@@ -34,10 +54,17 @@ class UpYunTestCase(unittest.TestCase):
             os.path.join(REMOTE_DIR, 'upyun-test.gif'))
 
     def setUp(self):
-        self.client_file = UpYun(self.BUCKET_FILE,
-                (self.USERNAME, self.PASSWD), const.SPACE_TYPE_FILE)
-        self.client_image = UpYun(self.BUCKET_IMAGE,
-                (self.USERNAME, self.PASSWD), const.SPACE_TYPE_IMAGE)
+        self.server = None
+        if not self.USERNAME:
+            # no credentials, test against a local stand-in of the service
+            self.server = FakeUpYun().start()
+            self.BUCKET_FILE, self.BUCKET_IMAGE = 'test-file', 'test-image'
+            self.USERNAME = self.PASSWD = 'test'
+            self.THUMB_VERSION = 'small'
+        self.client_file = self._client(self.BUCKET_FILE,
+                const.SPACE_TYPE_FILE)
+        self.client_image = self._client(self.BUCKET_IMAGE,
+                const.SPACE_TYPE_IMAGE)
         self.test_file_txt = open(self.LOCAL_PATH_TXT_FILE)
         self.test_file_img = open(self.LOCAL_PATH_IMG_FILE, 'rb')
 
@@ -49,6 +76,14 @@ class UpYunTestCase(unittest.TestCase):
         self._delete(self.REMOTE_PATH_IMG_FILE, self.client_image)
         self._delete(self.REMOTE_DIR, self.client_image)
         self._delete(self.REMOTE_DIR, self.client_file)
+        if self.server is not None:
+            self.server.stop()
+
+    def _client(self, bucket, stype, **kwargs):
+        if self.server is not None:
+            kwargs.setdefault('host_selector',
+                    HostSelector([self.server.host]))
+        return UpYun(bucket, (self.USERNAME, self.PASSWD), stype, **kwargs)
 
     def _put_file(self):
         return self.client_file.put(
@@ -82,6 +117,93 @@ class UpYunTestCase(unittest.TestCase):
         assert isinstance(resp.width, int)
         assert resp.width > 0
 
+    def test_put_resumable(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        state_path = os.path.join(tmp_dir, 'state')
+        resp = self.client_file.put_resumable(self.REMOTE_PATH_IMG_FILE,
+                self.LOCAL_PATH_IMG_FILE, state_path=state_path)
+        assert resp.success, resp.error
+        assert not os.path.exists(state_path)
+        resp = self.client_file.get(self.REMOTE_PATH_IMG_FILE)
+        assert resp.data == self.test_file_img.read()
+        # the assembled file is verified against the md5 of the local file
+        client = self.client_file
+        request = client._request
+
+        def tampering_request(method, path, *args, **kwargs):
+            headers = kwargs.get('headers') or {}
+            if const.HEADER_MULTI_MD5 in headers:
+                headers[const.HEADER_MULTI_MD5] = hashlib.md5('').hexdigest()
+            return request(method, path, *args, **kwargs)
+        client._request = tampering_request
+        resp = client.put_resumable(self.REMOTE_PATH_IMG_FILE,
+                self.LOCAL_PATH_IMG_FILE, state_path=state_path)
+        assert not resp.success
+
+    def test_put_resumable_resume(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        filename = os.path.join(tmp_dir, 'large.bin')
+        data = os.urandom(3 * const.MULTIPART_UNIT)
+        with open(filename, 'wb') as f:
+            f.write(data)
+        client = self._client(self.BUCKET_FILE, const.SPACE_TYPE_FILE,
+                retry=False)
+        request = client._request
+        sent = []
+
+        def failing_request(method, path, *args, **kwargs):
+            part = (kwargs.get('headers') or {}).get(const.HEADER_PART_ID)
+            if part is not None:
+                sent.append(part)
+                if len(sent) == 2:
+                    raise requests.exceptions.ConnectionError('part failed')
+            return request(method, path, *args, **kwargs)
+        client._request = failing_request
+        # the upload crashes on the second part
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client.put_resumable(self.REMOTE_PATH_TXT_FILE, filename,
+                    part_size=const.MULTIPART_UNIT, workers=1)
+        assert sent == ['0', '1', '2']
+        del sent[:]
+        resp = client.put_resumable(self.REMOTE_PATH_TXT_FILE, filename,
+                part_size=const.MULTIPART_UNIT, workers=1)
+        assert resp.success, resp.error
+        # only the failed part is sent again
+        assert sent == ['1']
+        assert client.get(self.REMOTE_PATH_TXT_FILE).data == data
+
+    def test_put_resumable_expired(self):
+        if self.server is None:
+            return
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        filename = os.path.join(tmp_dir, 'large.bin')
+        data = os.urandom(2 * const.MULTIPART_UNIT)
+        with open(filename, 'wb') as f:
+            f.write(data)
+        client = self._client(self.BUCKET_FILE, const.SPACE_TYPE_FILE,
+                retry=False)
+        request = client._request
+
+        def failing_request(method, path, *args, **kwargs):
+            if (kwargs.get('headers') or {}).get(const.HEADER_PART_ID) == '1':
+                raise requests.exceptions.ConnectionError('part failed')
+            return request(method, path, *args, **kwargs)
+        client._request = failing_request
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client.put_resumable(self.REMOTE_PATH_TXT_FILE, filename,
+                    part_size=const.MULTIPART_UNIT, workers=1)
+        # the server drops the upload
+        self.server._uploads.clear()
+        client._request = request
+        resp = client.put_resumable(self.REMOTE_PATH_TXT_FILE, filename,
+                part_size=const.MULTIPART_UNIT, workers=1)
+        assert resp.success, resp.error
+        assert not os.path.exists(filename + '.upyun')
+        assert client.get(self.REMOTE_PATH_TXT_FILE).data == data
+
     def test_put_thumbnail_version(self):
         resp = self.client_image.put_thumbnail(self.REMOTE_PATH_IMG_FILE,
                 self.test_file_img, self.THUMB_VERSION)
@@ -99,6 +221,63 @@ class UpYunTestCase(unittest.TestCase):
                 quality=100, sharpen=True)
         assert resp.success, resp.error
 
+    def test_put_iterable(self):
+        resp = self.client_file.put(self.REMOTE_PATH_TXT_FILE,
+                (l for l in self.test_file_txt), verify=False)
+        assert resp.success, resp.error
+        resp = self.client_file.get(self.REMOTE_PATH_TXT_FILE)
+        self.test_file_txt.seek(0)
+        assert resp.data == self.test_file_txt.read()
+
+    def test_put_unseekable(self):
+        r, w = os.pipe()
+        os.write(w, 'unseekable')
+        os.close(w)
+        with os.fdopen(r, 'rb') as f:
+            resp = self.client_file.put(self.REMOTE_PATH_TXT_FILE, f)
+        assert resp.success, resp.error
+        resp = self.client_file.get(self.REMOTE_PATH_TXT_FILE)
+        assert resp.data == 'unseekable'
+
+    def test_put_md5(self):
+        data = self.test_file_txt.read()
+        resp = self.client_file.put(self.REMOTE_PATH_TXT_FILE, data,
+                md5=hashlib.md5(data).hexdigest())
+        assert resp.success, resp.error
+        resp = self.client_file.put(self.REMOTE_PATH_TXT_FILE, data,
+                md5=hashlib.md5('').hexdigest())
+        assert not resp.success
+
+    def test_put_many(self):
+        items = [(self.REMOTE_PATH_TXT_FILE, self.test_file_txt),
+                (self.REMOTE_PATH_IMG_FILE, self.test_file_img)]
+        uploads = self.client_file.put_many(items, workers=2)
+        results = dict(uploads)
+        assert sorted(results) == sorted(p for p, _ in items)
+        for resp in results.itervalues():
+            assert resp.success, resp.error
+        assert uploads.stats.done == 2
+        assert uploads.stats.failed == 0
+
+    def test_bulk_backlog(self):
+        taken = []
+
+        def items():
+            for i in xrange(100000):
+                taken.append(i)
+                yield i
+        threads = set(threading.enumerate())
+        results = Bulk(lambda i: i, items(), 2, backlog=4)
+        time.sleep(0.2)
+        # the backlogs of items and of results, the workers and the feeder
+        assert len(taken) <= 4 + 4 + 2 + 1
+        results.close()
+        for _ in xrange(100):
+            if not set(threading.enumerate()) - threads:
+                break
+            time.sleep(0.01)
+        assert not set(threading.enumerate()) - threads
+
     def test_get_text_file(self):
         self._put_file()
         resp = self.client_file.get(self.REMOTE_PATH_TXT_FILE)
@@ -114,6 +293,175 @@ class UpYunTestCase(unittest.TestCase):
         self.test_file_img.seek(0)
         assert resp.data == self.test_file_img.read()
 
+    def test_get_stream(self):
+        self._put_file()
+        resp = self.client_file.get(self.REMOTE_PATH_TXT_FILE, stream=True)
+        assert resp.success, resp.error
+        self.test_file_txt.seek(0)
+        assert ''.join(resp.iter_content(8)) == self.test_file_txt.read()
+
+    def test_get_to_file(self):
+        self._put_file()
+        dest = StringIO.StringIO()
+        resp = self.client_file.get_to_file(self.REMOTE_PATH_TXT_FILE, dest)
+        assert resp.success, resp.error
+        self.test_file_txt.seek(0)
+        assert dest.getvalue() == self.test_file_txt.read()
+
+    def test_get_range(self):
+        self.client_file.put(self.REMOTE_PATH_TXT_FILE, self.test_file_txt)
+        self.test_file_txt.seek(0)
+        data = self.test_file_txt.read()
+        resp = self.client_file.get(self.REMOTE_PATH_TXT_FILE, range=(1, 3))
+        assert resp.success, resp.error
+        assert resp.data == data[1:4]
+
+    def test_get_segmented(self):
+        self.client_file.put(self.REMOTE_PATH_TXT_FILE, self.test_file_txt)
+        self.test_file_txt.seek(0)
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        filename = os.path.join(tmp_dir, 'segmented.txt')
+        resp = self.client_file.get_segmented(self.REMOTE_PATH_TXT_FILE,
+                filename, min_segment_size=4)
+        assert resp.success, resp.error
+        with open(filename, 'rb') as f:
+            assert f.read() == self.test_file_txt.read()
+
+    def test_get_many(self):
+        self._put_file()
+        self._put_image(self.client_file)
+        chunks = []
+        items = [(self.REMOTE_PATH_TXT_FILE, StringIO.StringIO()),
+                (self.REMOTE_PATH_IMG_FILE, chunks.append)]
+        downloads = self.client_file.get_many(items, workers=2)
+        for path, resp in downloads:
+            assert resp.success, resp.error
+        self.test_file_txt.seek(0)
+        assert items[0][1].getvalue() == self.test_file_txt.read()
+        self.test_file_img.seek(0)
+        assert ''.join(chunks) == self.test_file_img.read()
+        assert downloads.stats.done == 2
+
+    def test_shared_adapter(self):
+        adapter = PoolAdapter(pool_maxsize=1, pool_block=True)
+        client_file = self._client(self.BUCKET_FILE,
+                const.SPACE_TYPE_FILE, adapter=adapter)
+        client_image = self._client(self.BUCKET_IMAGE,
+                const.SPACE_TYPE_IMAGE, adapter=adapter)
+        resp = client_file.put(self.REMOTE_PATH_TXT_FILE, self.test_file_txt)
+        assert resp.success, resp.error
+        resp = client_image.put(self.REMOTE_PATH_IMG_FILE, self.test_file_img)
+        assert resp.success, resp.error
+        assert client_file.pool_stats is client_image.pool_stats
+        assert adapter.stats.requests == 2
+        assert adapter.stats.new_connections == 1
+
+    def test_retry_policy(self):
+        policy = RetryPolicy(total=1, budget=RetryBudget(ratio=0, reserve=1))
+        assert policy.is_idempotent('GET')
+        assert not policy.is_idempotent('PUT', {})
+        assert policy.is_idempotent('PUT', {const.HEADER_MD5: ''})
+        assert not policy.is_idempotent('POST')
+        error = requests.exceptions.ConnectionError()
+        assert policy.should_retry('GET', None, 1, error=error)
+        assert not policy.should_retry('GET', None, 2, error=error)
+        assert not policy.should_retry('GET', None, 1, error=error)
+        assert policy.retries == 1
+        if self.server is None:
+            return
+        # a generator body can not be sent again, its retry is not counted
+        budget = RetryBudget(ratio=0, reserve=1)
+        policy = RetryPolicy(backoff=0.01, budget=budget)
+        client = self._client(self.BUCKET_FILE, const.SPACE_TYPE_FILE,
+                retry=policy)
+        self.server.error_rate = 1
+        resp = client.put(self.REMOTE_PATH_TXT_FILE, iter(['x']),
+                md5=hashlib.md5('x').hexdigest())
+        assert resp.response.status_code == 503
+        assert resp.retries == 0
+        assert policy.retries == 0
+        assert budget.withdraw()
+        # a request earns its share of the budget once, not on every try
+        budget = RetryBudget(ratio=0.5, reserve=2)
+        policy = RetryPolicy(backoff=0.01, budget=budget)
+        client = self._client(self.BUCKET_FILE, const.SPACE_TYPE_FILE,
+                retry=policy)
+        resp = client.usage()
+        assert resp.retries == 2
+
+    def test_timeout(self):
+        assert request_timeout((1, 5), 2) in ((1, 2), 2)
+        assert request_timeout(None, 2) == 2
+        client = self._client(self.BUCKET_FILE,
+                const.SPACE_TYPE_FILE, timeout=(10, 30), deadline=60)
+        resp = client.usage()
+        assert resp.success, resp.error
+        if self.server is not None:
+            self.server.latency = 0.2
+        with pytest.raises(DeadlineExceeded):
+            client.info(self.REMOTE_PATH_TXT_FILE, timeout=0.001,
+                    deadline=0.001)
+        if self.server is None:
+            return
+        # a retry cancelled by the deadline is not counted
+        self.server.latency = 0
+        self.server.error_rate = 1
+        budget = RetryBudget(ratio=0, reserve=5)
+        policy = RetryPolicy(backoff=10, jitter=0, budget=budget)
+        client = self._client(self.BUCKET_FILE, const.SPACE_TYPE_FILE,
+                retry=policy, deadline=1)
+        requests_before = self.server.requests
+        resp = client.usage()
+        assert resp.deadline_exceeded
+        assert self.server.requests - requests_before == 1
+        assert policy.retries == 0
+        assert all(budget.withdraw() for _ in xrange(5))
+
+    def test_metrics(self):
+        events, lines = [], []
+        histogram = Histogram()
+        client = self._client(self.BUCKET_FILE,
+                const.SPACE_TYPE_FILE, metrics=[events.append, histogram,
+                    StatsdSink(write=lines.append)])
+        resp = client.put(self.REMOTE_PATH_TXT_FILE, 'metrics')
+        assert resp.success, resp.error
+        client.get(self.REMOTE_PATH_TXT_FILE)
+        assert [e.op for e in events] == ['put', 'get']
+        assert events[0].bytes_sent == events[1].bytes_received == 7
+        assert events[1].status == 200
+        assert histogram.snapshot()['get']['count'] == 1
+        assert lines[0].startswith('upyun.put.requests:1|c')
+
+    def test_host_selector(self):
+        if self.server is None:
+            selector = HostSelector()
+            client = self._client(self.BUCKET_FILE,
+                    const.SPACE_TYPE_FILE, host_selector=selector)
+            client.probe_hosts()
+            resp = client.put(self.REMOTE_PATH_TXT_FILE, self.test_file_txt)
+            assert resp.success, resp.error
+            best = selector.select()
+            assert selector.stats()[best][0] is not None
+            return
+        # a fast host with a slow transfer rate and a slow host
+        self.server.latency = 0.0025
+        self.server.bandwidth = 16 * 1024 * 1024
+        slow = FakeUpYun(latency=0.05).start()
+        self.addCleanup(slow.stop)
+        fast = self.server.host
+        selector = HostSelector([fast, slow.host])
+        client = self._client(self.BUCKET_FILE,
+                const.SPACE_TYPE_FILE, host_selector=selector)
+        client.probe_hosts()
+        assert selector.select() == fast
+        resp = client.put(self.REMOTE_PATH_TXT_FILE, 'x' * 4 * 1024 * 1024)
+        assert resp.success, resp.error
+        resp = client.info(self.REMOTE_PATH_TXT_FILE)
+        assert resp.success, resp.error
+        assert selector.select() == fast
+        assert selector.stats()[fast][0] < selector.stats()[slow.host][0]
+
     def test_ls(self):
         client = self.client_file
         self._put_file()
@@ -124,6 +472,50 @@ class UpYunTestCase(unittest.TestCase):
         assert self.REMOTE_PATH_TXT_FILE in remote_file_paths
         assert self.REMOTE_PATH_IMG_FILE in remote_file_paths
 
+    def test_ls_iter(self):
+        client = self.client_file
+        self._put_file()
+        self._mkdir()
+        resp = client.ls(os.path.dirname(self.REMOTE_DIR))
+        assert resp.success, resp.error
+        folders = list(resp.iter_folders())
+        assert os.path.basename(self.REMOTE_DIR) in [f.name for f in folders]
+        assert all(f.type == const.FILE_TYPE_FOLDER for f in folders)
+        resp = client.ls(self.REMOTE_DIR)
+        f = next(resp.iter_files())
+        assert f == resp.files[f.name]
+        assert f.path == self.REMOTE_PATH_TXT_FILE
+        assert isinstance(f.mtime, datetime.datetime)
+        for protocol in xrange(pickle.HIGHEST_PROTOCOL + 1):
+            assert pickle.loads(pickle.dumps(f, protocol)) == f
+        assert f._replace(size=1) == tuple(f)[:4] + (1, f.mtime)
+
+    def test_ls_compact(self):
+        client = self.client_file
+        self._put_file()
+        self._put_image(client)
+        resp = client.ls(self.REMOTE_DIR)
+        assert resp.success, resp.error
+        listing = resp.compact()
+        assert len(listing) == len(resp.stuffs)
+        for name, f in resp.stuffs.iteritems():
+            assert name in listing
+            assert listing.get(name) == f
+        assert listing.get('not-existed') is None
+
+    def test_walk(self):
+        client = self.client_file
+        self._put_file()
+        top = os.path.dirname(self.REMOTE_DIR)
+        walked = dict((d, (folders, files))
+                for d, folders, files in client.walk(top, max_depth=1))
+        assert top in walked
+        assert self.REMOTE_DIR in walked
+        folders, files = walked[self.REMOTE_DIR]
+        assert [f.path for f in files] == [self.REMOTE_PATH_TXT_FILE]
+        walked = list(client.walk(top, max_depth=0))
+        assert len(walked) == 1
+
     def test_mkdir(self):
         resp = self._mkdir()
         assert resp.success, resp.error
@@ -150,6 +542,182 @@ class UpYunTestCase(unittest.TestCase):
         resp = self.client_image.info(self.REMOTE_PATH_IMG_FILE)
         _assert(resp)
 
+    def test_sync(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        manifest = os.path.join(tmp_dir, 'manifest')
+        plan = self.client_file.sync(self.ASSET, self.REMOTE_DIR,
+                manifest=manifest, dry_run=True)
+        assert len(plan.uploads) == 2
+        assert plan.run(), plan.failed
+        plan = self.client_file.sync(self.ASSET, self.REMOTE_DIR,
+                manifest=manifest)
+        assert not plan.uploads
+        assert plan.unchanged == 2
+        resp = self.client_file.get(self.REMOTE_PATH_TXT_FILE)
+        assert resp.data == self.test_file_txt.read()
+
+    def test_mirror(self):
+        self.client_file.put(self.REMOTE_PATH_TXT_FILE, self.test_file_txt)
+        local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, local_dir)
+        plan = self.client_file.mirror(self.REMOTE_DIR, local_dir,
+                dry_run=True)
+        assert len(plan.downloads) == 1
+        assert plan.run(), plan.failed
+        plan = self.client_file.mirror(self.REMOTE_DIR, local_dir)
+        assert not plan.downloads
+        assert plan.unchanged == 1
+        self.test_file_txt.seek(0)
+        local = os.path.join(local_dir,
+                os.path.basename(self.REMOTE_PATH_TXT_FILE))
+        with open(local, 'rb') as f:
+            assert f.read() == self.test_file_txt.read()
+
+    def test_mirror_listing_error(self):
+        client = self.client_file
+        top = self.REMOTE_DIR + '/mirror'
+        for path in ('/x.txt', '/b/y.txt'):
+            resp = client.put(top + path, 'x', mkdir=True)
+            assert resp.success, resp.error
+        local_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, local_dir)
+        assert client.mirror(top, local_dir).run()
+        ls = client.ls
+
+        def failing_ls(path, **kwargs):
+            if path.endswith('/b'):
+                raise requests.exceptions.ConnectionError('listing failed')
+            return ls(path, **kwargs)
+        client.ls = failing_ls
+        plan = client.mirror(top, local_dir, delete=True)
+        assert [path for path, _ in plan.failed] == [top + '/b']
+        assert not plan.deletes
+        assert os.path.exists(os.path.join(local_dir, 'b', 'y.txt'))
+        client.ls = ls
+        client.rmtree(top)
+
+    def test_metadata_cache(self):
+        cache = MetadataCache()
+        client = self._client(self.BUCKET_FILE,
+                const.SPACE_TYPE_FILE, metadata_cache=cache)
+        resp = client.info(self.REMOTE_PATH_TXT_FILE)
+        assert not resp.success
+        assert client.info(self.REMOTE_PATH_TXT_FILE) is resp
+        client.put(self.REMOTE_PATH_TXT_FILE, self.test_file_txt)
+        resp = client.info(self.REMOTE_PATH_TXT_FILE)
+        assert resp.success, resp.error
+        assert client.info(self.REMOTE_PATH_TXT_FILE) is resp
+        resp = client.ls(self.REMOTE_DIR)
+        assert client.ls(self.REMOTE_DIR) is resp
+        client.delete(self.REMOTE_PATH_TXT_FILE)
+        assert not client.info(self.REMOTE_PATH_TXT_FILE).success
+        assert not client.ls(self.REMOTE_DIR).files
+
+    def test_content_cache(self):
+        cache = ContentCache()
+        client = self._client(self.BUCKET_FILE,
+                const.SPACE_TYPE_FILE, content_cache=cache)
+        client.put(self.REMOTE_PATH_TXT_FILE, self.test_file_txt)
+        self.test_file_txt.seek(0)
+        data = self.test_file_txt.read()
+        resp = client.get(self.REMOTE_PATH_TXT_FILE)
+        assert resp.success, resp.error
+        assert not resp.from_cache
+        resp = client.get(self.REMOTE_PATH_TXT_FILE)
+        assert resp.success, resp.error
+        assert resp.data == data
+        client.put(self.REMOTE_PATH_TXT_FILE, 'changed')
+        resp = client.get(self.REMOTE_PATH_TXT_FILE)
+        assert not resp.from_cache
+        assert resp.data == 'changed'
+
+    def test_content_cache_folder(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        with open(os.path.join(path, 'notes.txt'), 'w') as f:
+            f.write('notes')
+        with open(os.path.join(path, 'other.json'), 'w') as f:
+            f.write('{"a": 1}')
+        client = self._client(self.BUCKET_FILE, const.SPACE_TYPE_FILE,
+                content_cache=ContentCache(path=path, max_age=60))
+        client.put(self.REMOTE_PATH_TXT_FILE, 'cached')
+        assert client.get(self.REMOTE_PATH_TXT_FILE).data == 'cached'
+        # loaded by a new cache, among the other files
+        cache = ContentCache(path=path, max_age=60)
+        client = self._client(self.BUCKET_FILE, const.SPACE_TYPE_FILE,
+                content_cache=cache)
+        assert client.get(self.REMOTE_PATH_TXT_FILE).from_cache
+        cache.clear()
+        assert sorted(os.listdir(path)) == ['notes.txt', 'other.json']
+
+    def test_bench(self):
+        results = bench.run(['sign', 'listing'], quick=True)
+        assert results['results']['sign'][0]['us_per_request'] > 0
+        assert [r['entries'] for r in results['results']['listing']] == \
+                [1000, 10000]
+        json.dumps(results)
+
+    def test_sign_headers(self):
+        self._put_file()
+        host = self.server.host if self.server is not None else \
+                const.UPAIYUN_API_HOSTS[const.API_HOST_AUTO]
+        path = '/' + self.BUCKET_FILE + self.REMOTE_PATH_TXT_FILE
+        auth = UpYunDigestAuthentication(self.USERNAME, self.PASSWD)
+        headers = auth.sign('GET', path, 0)
+        assert abs(calendar.timegm(email.utils.parsedate(headers['Date'])) -
+                time.time()) < 5
+        assert headers['Authorization'] == 'UpYun %s:%s' % (self.USERNAME,
+                hashlib.md5('&'.join(('GET', path, headers['Date'], '0',
+                    hashlib.md5(self.PASSWD).hexdigest()))).hexdigest())
+        # sent by any HTTP client, without the requests hook
+        r = requests.get('http://' + host + path, headers=headers)
+        assert r.status_code == requests.codes.ok, r.content
+        self.test_file_txt.seek(0)
+        assert r.content == self.test_file_txt.read()
+
+    def test_sign(self):
+        assert http_date(0) == 'Thu, 01 Jan 1970 00:00:00 GMT'
+        assert http_date(86399.9) == 'Thu, 01 Jan 1970 23:59:59 GMT'
+        auth = UpYunDigestAuthentication('user', 'passwd')
+        expected = hashlib.md5('PUT&/bucket/a.txt&%s&5&%s' % (http_date(0),
+            hashlib.md5('passwd').hexdigest())).hexdigest()
+        assert auth.signature('PUT', '/bucket/a.txt', http_date(0), 5) == \
+                expected
+        assert auth.signature('PUT', '/bucket/a.txt', http_date(0), '5') == \
+                expected
+        r = requests.Request('PUT', 'http://v0.api.upyun.com/bucket/a.txt',
+                data='hello').prepare()
+        while True:
+            signed = auth.sign('PUT', '/bucket/a.txt', 5)
+            auth(r)
+            # signed within the same second
+            if r.headers['Date'] == signed['Date']:
+                break
+        assert r.headers['Authorization'] == signed['Authorization']
+
+    def test_presign(self):
+        signer = self.client_file.presigner('form-secret', 'token-secret')
+        fields = signer.upload('a b.txt', expires=60, now=1000,
+                content_length_range='0,1024')
+        assert fields['action'].endswith('/' + self.BUCKET_FILE)
+        assert json.loads(base64.b64decode(fields['policy'])) == {
+                'bucket': self.BUCKET_FILE, 'expiration': 1060,
+                'save-key': '/a b.txt', 'content-length-range': '0,1024'}
+        assert fields['signature'] == hashlib.md5(fields['policy'] +
+                '&form-secret').hexdigest()
+        urls = list(signer.downloads(['/a b.txt', '/c.txt'], 60, now=1000))
+        assert urls[0] == signer.download('/a b.txt', 60, now=1000)
+        assert urls[0].startswith('http://%s/a%%20b.txt?_upt=' %
+                self.client_file.domain)
+        token = hashlib.md5('token-secret&1060&/c.txt').hexdigest()
+        assert urls[1].endswith('/c.txt?_upt=' + token[12:20] + '1060')
+        # checked when called, not when iterated
+        with pytest.raises(Exception):
+            self.client_file.presigner().uploads(['/a.txt'])
+        with pytest.raises(Exception):
+            self.client_file.presigner().downloads(['/a.txt'])
+
     def test_delete(self):
         self._put_file()
         resp = self.client_file.delete(self.REMOTE_PATH_TXT_FILE)
@@ -158,5 +726,41 @@ class UpYunTestCase(unittest.TestCase):
         resp = self.client_image.delete(self.REMOTE_PATH_IMG_FILE)
         assert resp.success, resp.error
 
+    def test_delete_many(self):
+        client = self.client_file
+        paths = [self.REMOTE_DIR + '/many-%d.txt' % i for i in xrange(5)]
+        for path in paths:
+            assert client.put(path, 'x').success
+        deleted = dict(client.delete_many(paths, workers=3))
+        assert sorted(deleted) == paths
+        for resp in deleted.values():
+            assert resp.success, resp.error
+
+    def test_rmtree(self):
+        client = self.client_file
+        top = self.REMOTE_DIR + '/rmtree'
+        for path in ('/a.txt', '/sub/b.txt', '/sub/deep/c.txt',
+                '/other/d.txt'):
+            resp = client.put(top + path, 'x', mkdir=True)
+            assert resp.success, resp.error
+        assert client.rmtree(top, workers=4) == []
+        assert client.info(top).response.status_code == 404
+        # already missing
+        assert client.rmtree(top) == []
+        if self.server is None:
+            return
+        # the bucket is emptied, its root is not deleted
+        deleted = []
+        delete = client.delete
+
+        def recording_delete(path, **kwargs):
+            deleted.append(path)
+            return delete(path, **kwargs)
+        client.delete = recording_delete
+        assert client.put(top + '/a.txt', 'x').success
+        assert client.rmtree('/', workers=1) == []
+        assert '/' not in deleted
+        assert not client.ls('/').files and not client.ls('/').folders
+
 if __name__ == '__main__':
     unittest.main()
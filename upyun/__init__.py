@@ -1,12 +1,19 @@
 import hashlib
+from operator import itemgetter
 import os.path
+import time
 from urllib import pathname2url
 from urlparse import urljoin
 
 import requests
 from requests.auth import AuthBase
 
-from . import const, response
+from . import bulk, const, metrics, response, stream, sync, transport, tree
+from .multipart import ResumableUpload
+from .presign import Presigner
+from .segmented import SegmentedDownload
+from .retry import DeadlineExceeded, RetryPolicy
+from .transport import PoolAdapter, request_timeout
 from .auth import UpYunDigestAuthentication
 
 __title__ = 'pyupyun'
@@ -27,6 +34,33 @@ class UpYun(object):
     :param api_host: API host to use, see :ref:`API Hosts <api-hosts>`
     :param str domain: Your custom domain
     :param bool ssl: Whether to use SSL
+    :param int chunk_size: Size of the chunks used when streaming files
+    :param digest_cache: :class:`~stream.DigestCache` to look up the md5 of
+                         unchanged files instead of hashing them again
+    :param int pool_maxsize: Max connections kept alive per host
+    :param bool pool_block: Whether to wait for a free connection when all
+                            the connections to a host are in use, making
+                            ``pool_maxsize`` a hard limit per host
+    :param bool keep_alive: Whether to keep the connections alive
+    :param adapter: :class:`~transport.PoolAdapter` to share the connection
+                    pools with other clients, overrides the pool options
+    :param retry: :class:`~retry.RetryPolicy` of the idempotent requests,
+                  default ``RetryPolicy()``, ``False`` to never retry
+    :param host_selector: :class:`~hosts.HostSelector` to route every
+                          request to the best API host, instead of
+                          ``api_host``
+    :param metadata_cache: :class:`~cache.MetadataCache` of :meth:`info`,
+                           :meth:`ls` and :meth:`usage`
+    :param content_cache: :class:`~cache.ContentCache` of the files
+                          downloaded by :meth:`get`
+    :param timeout: Default timeout of every try of a request in seconds, or
+                    ``(connect, read)`` seconds, see
+                    :func:`~transport.request_timeout`
+    :param float deadline: Default seconds a request may take in total,
+                           including its retries
+    :param metrics: Function called with a :class:`~metrics.RequestEvent`
+                    after every request, like a :class:`~metrics.Histogram`
+                    or a :class:`~metrics.StatsdSink`, or a list of them
 
     Usage::
 
@@ -34,17 +68,53 @@ class UpYun(object):
         client.put('/test.txt', open('/tmp/test.txt'))
     """
     def __init__(self, bucket, auth, stype, api_host=const.API_HOST_AUTO,
-            domain=None, ssl=False):
+            domain=None, ssl=False, chunk_size=const.DEFAULT_CHUNK_SIZE,
+            digest_cache=None, pool_maxsize=const.DEFAULT_POOL_MAXSIZE,
+            pool_block=False, keep_alive=True, adapter=None, retry=None,
+            host_selector=None, metadata_cache=None, content_cache=None,
+            timeout=None, deadline=None, metrics=None):
         self.bucket = bucket
+        self.chunk_size = chunk_size
+        self.digest_cache = digest_cache
         self.stype = stype
         self.api_host = api_host
+        self.ssl = ssl
         proto = 'https://' if ssl else 'http://'
+        self._proto = proto
         self._base_url = proto + const.UPAIYUN_API_HOSTS[self.api_host]
         self.domain = domain or (const.BUCKET_DOMAIN % bucket)
         self._bucket_base_url = proto + self.domain
 
+        #: The :class:`~hosts.HostSelector` routing the requests
+        self.host_selector = host_selector
+
+        #: The :class:`~cache.MetadataCache` of the metadata requests
+        self.metadata_cache = metadata_cache
+
+        #: The :class:`~cache.ContentCache` of the downloaded files
+        self.content_cache = content_cache
+
+        #: Functions called with a :class:`~metrics.RequestEvent` after every
+        #: request
+        self.metrics = metrics
+        if callable(metrics):
+            self.metrics = [metrics]
+
+        #: Default timeout of every try of a request
+        self.timeout = timeout
+
+        #: Default deadline of a request, including its retries
+        self.deadline = deadline
+
+        #: The :class:`~retry.RetryPolicy` of the requests
+        self.retry = RetryPolicy() if retry is None else retry
+
+        #: The :class:`~transport.PoolAdapter` holding the connection pools
+        self.adapter = adapter or PoolAdapter(pool_maxsize=pool_maxsize,
+                pool_block=pool_block)
+
         #: The :class:`requests.Session` object to use for the API requests
-        self.session = self._prepare_session(auth, ssl)
+        self.session = self._prepare_session(auth, ssl, keep_alive)
 
     @property
     def api_host(self):
@@ -68,43 +138,238 @@ class UpYun(object):
         else:
             raise Exception('stype: invalid space type')
 
-    def _prepare_session(self, auth, ssl):
+    @property
+    def pool_stats(self):
+        """Statistics of the connection pools, shared by the clients sharing
+        the adapter
+
+        :rtype: :class:`~transport.PoolStats`
+        """
+        return self.adapter.stats
+
+    def _prepare_session(self, auth, ssl, keep_alive=True):
         if isinstance(auth, AuthBase):
             self._auth = auth
         else:
             self._auth = auth if ssl else UpYunDigestAuthentication(*auth)
         s = requests.Session()
         s.auth = self._auth
+        s.mount('http://', self.adapter)
+        s.mount('https://', self.adapter)
+        if not keep_alive:
+            s.headers['Connection'] = 'close'
         return s
 
+    def _ensure_pool_size(self, size):
+        """Make sure the connection pools hold at least ``size`` connections
+        per host, so concurrent requests reuse them, unless the pools are
+        blocking, where the size is a limit set by the user"""
+        if not self.adapter.pool_block and self.adapter._pool_maxsize < size:
+            self.adapter.resize(size)
+
     def _get_file_url(self, path):
         return urljoin(self._bucket_base_url, path)
 
-    def _get_url(self, path):
-        return urljoin(self._base_url,
+    def _get_url(self, path, host=None):
+        base_url = self._proto + host if host else self._base_url
+        return urljoin(base_url,
                 pathname2url(os.path.join(self.bucket, path.lstrip('/'))))
 
+    def presigner(self, form_api_secret=None, token_secret=None):
+        """Build a :class:`~presign.Presigner` of the bucket, to sign uploads
+        and downloads made by other clients directly to UpYun
+
+        :param str form_api_secret: Form API secret of the bucket, needed to
+                                    sign uploads
+        :param str token_secret: Token secret of the bucket, needed to sign
+                                 downloads
+        :rtype: :class:`~presign.Presigner`
+        """
+        return Presigner(self.bucket, form_api_secret, token_secret,
+                self.api_host, self.domain, self.ssl)
+
+    def probe_hosts(self, timeout=5):
+        """Measure the latency of the API hosts of :attr:`host_selector`
+
+        :param float timeout: Seconds to wait for a host
+        """
+        self.host_selector.probe(self.session, self.ssl, timeout)
+
+    def _rewindable(self, data):
+        return data is None or \
+                isinstance(data, (basestring, stream.StreamBody))
+
+    def _request(self, method, path, response_cls, file_url, data=None,
+            headers=None, timeout=None, deadline=None, op=None, **kwargs):
+        """Send a request, retrying it according to :attr:`retry`, every
+        try is signed again, a file body is rewound and the API host is
+        selected again if there is a :attr:`host_selector`
+
+        Every try is bounded by ``timeout`` and clipped to the time left
+        before the deadline, no retry is made past the deadline. A request
+        failing for good because of the deadline raises
+        :class:`~retry.DeadlineExceeded` if it got no response, or returns a
+        response whose ``deadline_exceeded`` is set.
+
+        :param path: Path on the server
+        :param response_cls: Class of the response to return
+        :param file_url: URL of the file for the response
+        :param timeout: Timeout of every try, default :attr:`timeout`
+        :param float deadline: Seconds the request may take in total, default
+                               :attr:`deadline`
+        :param str op: Name of the operation for the :attr:`metrics`,
+                       default the method in lower case
+        :param kwargs: Other arguments of :meth:`requests.Session.request`
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = self.deadline if deadline is None else deadline
+        expires = None if deadline is None else time.time() + deadline
+        exceeded = False
+        attempt = 0
+        began = time.time()
+        # a request earns retries once, however many tries it takes
+        if self.retry:
+            self.retry.record()
+        while True:
+            attempt += 1
+            resp = error = None
+            host = self.host_selector.select() if self.host_selector else None
+            start = time.time()
+            if self.metrics or host:
+                transport.reset_timings()
+            try:
+                resp = self.session.request(method, self._get_url(path, host),
+                        data=data, headers=headers, timeout=request_timeout(
+                            timeout, expires and max(expires - start, 0.001)),
+                        **kwargs)
+            except requests.RequestException as e:
+                error = e
+            if host:
+                self._record_host(host, data, start, resp)
+            # a retry is counted and taken off the budget only once it is
+            # sure to be sent, with a body which can be sent again and
+            # before the deadline
+            retry = self.retry and self._rewindable(data) and \
+                    self.retry.can_retry(method, headers, attempt, resp, error)
+            if retry:
+                delay = self.retry.delay(attempt)
+                if expires is not None and time.time() + delay >= expires:
+                    exceeded = True
+                    break
+            if not (retry and self.retry.should_retry(method, headers,
+                    attempt, resp, error)):
+                # a try timed out by the deadline
+                exceeded = expires is not None and time.time() >= expires \
+                        and isinstance(error, requests.exceptions.Timeout)
+                break
+            if resp is not None:
+                resp.close()
+            if isinstance(data, stream.StreamBody):
+                data.rewind()
+            time.sleep(delay)
+        if method not in ('GET', 'HEAD'):
+            if self.metadata_cache is not None:
+                self.metadata_cache.invalidate(path)
+            if self.content_cache is not None:
+                self.content_cache.invalidate(path)
+        if self.metrics:
+            self._emit(op or method.lower(), method, path, host, data, resp,
+                    error, attempt - 1, began, start)
+        if error is not None:
+            if exceeded:
+                raise DeadlineExceeded('%s %s: deadline of %ss exceeded after '
+                        '%d tries: %s' % (method, path, deadline, attempt,
+                            error))
+            raise error
+        resp = response_cls(resp, file_url)
+        resp.retries = attempt - 1
+        resp.deadline_exceeded = exceeded and not resp.success
+        return resp
+
+    def _record_host(self, host, data, start, resp):
+        """Score a host by the time to the response headers of a request
+        without a body, sending a body takes a time depending on its size
+        rather than on the host, so a request with a body is timed by the
+        connect of a new connection, one round trip, if any"""
+        rtt = None
+        connect, first_byte = transport.last_timings()
+        if resp is not None:
+            if not data:
+                rtt = first_byte and first_byte - start
+            else:
+                rtt = connect
+        self.host_selector.record(host, rtt,
+                resp is None or resp.status_code >= 500)
+
+    def _emit(self, op, method, path, host, data, resp, error, retries,
+            began, start):
+        end = time.time()
+        connect, first_byte = transport.last_timings()
+        received = 0
+        if resp is not None and method != 'HEAD':
+            if resp._content_consumed:
+                received = len(resp.content)
+            else:
+                received = int(resp.headers.get('Content-Length') or 0)
+        event = metrics.RequestEvent(op, method, path,
+                host or self._base_url.split('://', 1)[1],
+                resp.status_code if resp is not None else None, error,
+                retries, len(data) if hasattr(data, '__len__') else
+                (None if data else 0), received, connect,
+                first_byte and first_byte - start, end - start, end - began)
+        for sink in self.metrics:
+            sink(event)
+
+    def _cached(self, op, path, request):
+        cache = self.metadata_cache
+        if cache is None:
+            return request()
+        resp = cache.get(op, path)
+        if resp is None:
+            resp = request()
+            cache.set(op, path, resp)
+        return resp
+
     def _get_data(self, fileo):
-        try:
-            data = fileo.read()
-        except AttributeError:
-            data = fileo
-        return data
+        """Get the request body of ``fileo``, files and iterables are wrapped
+        to be streamed in chunks instead of being read into memory"""
+        if isinstance(fileo, basestring):
+            return fileo
+        size = stream.get_size(fileo)
+        if size == 0:
+            return ''
+        if size is not None and hasattr(fileo, 'read'):
+            return stream.StreamBody(fileo, size, self.chunk_size)
+        return stream.iter_chunks(fileo, self.chunk_size)
 
     def _digest(self, data):
-        return hashlib.md5(data).hexdigest()
+        if isinstance(data, basestring):
+            return hashlib.md5(data).hexdigest()
+        if isinstance(data, stream.StreamBody):
+            fileo = data.fileo
+            if self.digest_cache is not None and fileo.tell() == 0 and \
+                    data.length == stream.get_size(fileo):
+                return self.digest_cache.digest(fileo, self.chunk_size)
+            return stream.md5_file(fileo, data.length, self.chunk_size)
+        raise Exception('put: verify needs a string or a file, not an iterable')
 
     def _prepare_put_request(self, path, fileo, mkdir, mimetype, secret,
-            verify, headers=None):
+            verify, headers=None, md5=None):
         """Prepaer the put request"""
-        url = self._get_url(path)
         data = self._get_data(fileo)
+        if verify and not md5 and hasattr(fileo, 'read') and \
+                not isinstance(data, (basestring, stream.StreamBody)):
+            # an unseekable file can not be read twice, to be hashed and
+            # sent, so it is read into memory
+            data = fileo.read()
         headers = headers or {}
         req_headers = {}
 
         if mkdir:
             req_headers[const.HEADER_MKDIR] = 'true'
-        if verify:
+        if md5:
+            req_headers[const.HEADER_MD5] = md5
+        elif verify:
             req_headers[const.HEADER_MD5] = self._digest(data)
         if mimetype:
             req_headers['Content-Type'] = mimetype
@@ -112,29 +377,86 @@ class UpYun(object):
             req_headers[const.HEADER_SECRET] = secret
 
         req_headers.update(headers)
-        return url, data, req_headers
+        return data, req_headers
 
     def put(self, path, fileo, mkdir=True, mimetype=None, secret=None,
-            verify=True, headers=None):
+            verify=True, headers=None, md5=None, timeout=None, deadline=None):
         """Put an file onto the server
 
         :param path: File path on the server
-        :param fileo: File like object of the file to upload
+        :param fileo: File like object, string or iterable of strings of the
+                      file to upload, files and iterables are streamed
         :param mkdir: Whether to make the parent folder if not existed
         :param mimetype: Mime-type of the file, used by server to determine
                          the extension of the file
         :param secret: Secret for user to later access the file uploaded
-        :param verify: Whether to verify the file integrity using md5 hashing
+        :param verify: Whether to verify the file integrity using md5 hashing,
+                       an unseekable file is read into memory to be hashed,
+                       an iterable can not be verified
         :param headers: Additional headers
+        :param str md5: Precomputed md5 hex digest of the file, used to verify
+                        the file integrity without hashing it
+        :param timeout: Timeout of every try, default :attr:`timeout`
+        :param float deadline: Seconds the request may take in total, default
+                               :attr:`deadline`
         :rtype: :class:`~response.Response` or
                 :class:`~response.PutImageResponse`
         """
-        url, data, headers = self._prepare_put_request(path, fileo, mkdir,
-                mimetype, secret, verify, headers or {})
-        resp = self.session.put(url=url, data=data, headers=headers)
+        data, headers = self._prepare_put_request(path, fileo, mkdir,
+                mimetype, secret, verify, headers or {}, md5)
         if self.stype == const.SPACE_TYPE_IMAGE:
-            return response.PutImageResponse(resp, self._get_file_url(path))
-        return response.Response(resp, self._get_file_url(path))
+            response_cls = response.PutImageResponse
+        else:
+            response_cls = response.Response
+        return self._request('PUT', path, response_cls,
+                self._get_file_url(path), data=data, headers=headers,
+                timeout=timeout, deadline=deadline)
+
+    def put_many(self, items, workers=const.DEFAULT_WORKERS, backlog=None,
+            **kwargs):
+        """Put many files concurrently in a pool of worker threads
+
+        Usage::
+
+            files = ((p, open(os.path.join(root, p), 'rb')) for p in paths)
+            uploads = client.put_many(files, workers=16)
+            for path, resp in uploads:
+                if isinstance(resp, Exception) or not resp.success:
+                    print 'failed', path
+            print uploads.stats.throughput
+
+        :param items: Iterable of ``(path, fileo)`` pairs, taken lazily
+        :param int workers: Number of worker threads
+        :param int backlog: Max number of items taken ahead of the workers
+        :param kwargs: Other arguments of :meth:`put`
+        :rtype: :class:`~bulk.Bulk` of ``(path, response)`` pairs, the
+                response is the exception raised if the request failed
+        """
+        self._ensure_pool_size(workers)
+        return bulk.Bulk(lambda item: self.put(item[0], item[1], **kwargs),
+                items, workers, backlog, key=itemgetter(0),
+                size=lambda resp: int(resp.response.request.headers.get(
+                    'Content-Length', 0)))
+
+    def put_resumable(self, path, filename, part_size=const.DEFAULT_PART_SIZE,
+            workers=const.DEFAULT_WORKERS, state_path=None, mimetype=None):
+        """Put a large local file in parts uploaded concurrently, the
+        progress is kept in a local state file so calling it again after a
+        failure or a crash resumes the upload, see
+        :class:`~multipart.ResumableUpload`
+
+        :param path: File path on the server
+        :param str filename: Path of the local file
+        :param int part_size: Size of the parts, a multiple of
+                              :const:`~const.MULTIPART_UNIT`
+        :param int workers: Number of parts uploaded concurrently
+        :param str state_path: Path of the state file, default ``filename``
+                               followed by ``.upyun``
+        :param mimetype: Mime-type of the file
+        :rtype: :class:`~response.MultipartResponse`
+        """
+        return ResumableUpload(self, path, filename, part_size, workers,
+                state_path, mimetype).run()
 
     def put_thumbnail(self, path, fileo, version=None, ttype=None, res=None,
             quality=None, sharpen=None, **kwargs):
@@ -148,6 +470,7 @@ class UpYun(object):
         :param res: Image resolution, format: (width, height)
         :param quality: Image quality, default: 90
         :param sharpen: Whether to sharpen the image
+        :param kwargs: Other arguments of :meth:`put`
         :type res: tuple
         :type sharpen: bool
         :rtype: :class:`~response.PutImageResponse`
@@ -181,60 +504,302 @@ class UpYun(object):
 
         return self.put(path, fileo, headers=headers, **kwargs)
 
-    def get(self, path):
+    def get(self, path, stream=False, range=None, timeout=None,
+            deadline=None):
         """Get a file
 
         :param path: Path of the file to retrieve
+        :param bool stream: Whether to defer downloading the data until it is
+                            accessed, use
+                            :meth:`~response.GetMixin.iter_content` to read
+                            it in chunks, a streamed request bypasses the
+                            :attr:`content_cache`
+        :param range: ``(start, end)`` offsets of the bytes to retrieve, the
+                      end is inclusive and ``None`` reads to the end of the
+                      file, a ranged request bypasses the
+                      :attr:`content_cache` and succeeds with status ``206``
+        :param timeout: Timeout of every try, default :attr:`timeout`
+        :param float deadline: Seconds the request may take in total, default
+                               :attr:`deadline`, reading a streamed response
+                               is not covered
         :rtype: :class:`~response.GetResponse`
         """
-        resp = self.session.get(self._get_url(path))
-        return response.GetResponse(resp, self._get_file_url(path))
+        headers = None
+        if range is not None:
+            start, end = range
+            headers = {'Range': 'bytes=%d-%s' % (start,
+                '' if end is None else end)}
+        elif self.content_cache is not None and not stream:
+            return self._get_cached(path, timeout, deadline)
+        return self._request('GET', path, response.GetResponse,
+                self._get_file_url(path), headers=headers, timeout=timeout,
+                deadline=deadline, stream=stream)
+
+    def _get_cached(self, path, timeout=None, deadline=None):
+        cache = self.content_cache
+        file_url = self._get_file_url(path)
+        cached = cache.lookup(path)
+        headers = None
+        if cached is not None:
+            meta, data = cached
+            if cache.fresh(meta):
+                return self._from_cache(meta, data, file_url)
+            cache.revalidations += 1
+            if not cache.head:
+                headers = cache.conditional_headers(meta)
+            elif cache.matches(meta, self.info(path, timeout, deadline)):
+                cache.validated(meta)
+                return self._from_cache(meta, data, file_url)
+        resp = self._request('GET', path, response.GetResponse, file_url,
+                headers=headers, timeout=timeout, deadline=deadline)
+        if cached is not None and \
+                resp.response.status_code == requests.codes.not_modified:
+            cache.validated(meta)
+            return self._from_cache(meta, data, file_url, resp.retries)
+        cache.misses += 1
+        cache.store(path, resp)
+        return resp
+
+    def _from_cache(self, meta, data, file_url, retries=0):
+        self.content_cache.hits += 1
+        resp = response.GetResponse(self.content_cache.response(meta, data),
+                file_url)
+        resp.retries = retries
+        resp.from_cache = True
+        return resp
+
+    def get_to_file(self, path, dest):
+        """Download a file to the disk, the data is written in chunks as it
+        arrives instead of being held in memory
+
+        :param path: Path of the file to retrieve
+        :param dest: Local file path, a writable file like object or a
+                     function called with every chunk, a local file is only
+                     created if the request is successful
+        :rtype: :class:`~response.GetResponse`
+        """
+        resp = self.get(path, stream=True)
+        if not resp.success:
+            return resp
+        if isinstance(dest, basestring):
+            with open(dest, 'wb') as f:
+                self._write_to(resp, f.write)
+        elif hasattr(dest, 'write'):
+            self._write_to(resp, dest.write)
+        else:
+            self._write_to(resp, dest)
+        return resp
+
+    def _write_to(self, resp, write):
+        for chunk in resp.iter_content(self.chunk_size):
+            write(chunk)
 
-    def delete(self, path):
+    def get_segmented(self, path, filename, segments=const.DEFAULT_SEGMENTS,
+            min_segment_size=const.MIN_SEGMENT_SIZE, workers=None):
+        """Download a large file in byte ranges fetched concurrently into a
+        preallocated local file, see :class:`~segmented.SegmentedDownload`
+
+        :param path: Path of the file to retrieve
+        :param str filename: Path of the local file
+        :param int segments: Max number of ranges
+        :param int min_segment_size: Ranges are not split smaller than it
+        :param int workers: Number of ranges fetched concurrently, default
+                            the number of ranges
+        :returns: :class:`~response.InfoResponse` of the file, or the
+                  response of the first request failed
+        """
+        return SegmentedDownload(self, path, filename, segments,
+                min_segment_size, workers).run()
+
+    def get_many(self, items, workers=const.DEFAULT_WORKERS, backlog=None,
+            connections=None):
+        """Download many files concurrently in a pool of worker threads, each
+        file is streamed so at most about ``workers * chunk_size`` bytes are
+        held in memory
+
+        Usage::
+
+            dests = ((p, os.path.join(root, p.lstrip('/'))) for p in paths)
+            for path, resp in client.get_many(dests, workers=16):
+                if isinstance(resp, Exception) or not resp.success:
+                    print 'failed', path
+
+        :param items: Iterable of ``(path, dest)`` pairs, taken lazily, see
+                      :meth:`get_to_file` for ``dest``
+        :param int workers: Number of worker threads
+        :param int backlog: Max number of items taken ahead of the workers
+        :param int connections: Connections kept in the pool per host, default
+                                the number of workers
+        :rtype: :class:`~bulk.Bulk` of ``(path, response)`` pairs, the
+                response is the exception raised if the request failed
+        """
+        self._ensure_pool_size(connections or workers)
+        return bulk.Bulk(lambda item: self.get_to_file(item[0], item[1]),
+                items, workers, backlog, key=itemgetter(0),
+                size=lambda resp: int(resp.response.headers.get(
+                    'Content-Length', 0)))
+
+    def delete(self, path, timeout=None, deadline=None):
         """Delete a file or an empty folder
 
         :param path: Path of the file or folder to delete
+        :param timeout: Timeout of every try, default :attr:`timeout`
+        :param float deadline: Seconds the request may take in total, default
+                               :attr:`deadline`
         :rtype: :class:`~response.Response`
         """
-        resp = self.session.delete(self._get_url(path))
-        return response.Response(resp, None)
+        return self._request('DELETE', path, response.Response,
+                None, timeout=timeout, deadline=deadline)
+
+    def delete_many(self, paths, workers=const.DEFAULT_WORKERS, backlog=None,
+            **kwargs):
+        """Delete many files or empty folders concurrently in a pool of
+        worker threads
+
+        Usage::
+
+            for path, resp in client.delete_many(paths, workers=32):
+                if isinstance(resp, Exception) or not resp.success:
+                    print 'failed', path
+
+        :param paths: Iterable of paths, taken lazily
+        :param int workers: Number of worker threads
+        :param int backlog: Max number of paths taken ahead of the workers
+        :param kwargs: Other arguments of :meth:`delete`
+        :rtype: :class:`~bulk.Bulk` of ``(path, response)`` pairs, the
+                response is the exception raised if the request failed
+        """
+        self._ensure_pool_size(workers)
+        return bulk.Bulk(lambda path: self.delete(path, **kwargs), paths,
+                workers, backlog)
+
+    def rmtree(self, path, workers=const.DEFAULT_WORKERS, onerror=None):
+        """Delete a folder and everything below it, the files are deleted
+        concurrently as the tree is walked, then the folders bottom-up, see
+        :func:`~tree.rmtree`
+
+        :param path: Path of the folder
+        :param int workers: Number of requests sent concurrently
+        :param onerror: Function called with ``(path, response)`` when
+                        listing or deleting a path fails
+        :returns: ``(path, response)`` pairs of the failures, empty if the
+                  tree is deleted
+        :rtype: :class:`list`
+        """
+        return tree.rmtree(self, path, workers, onerror)
 
-    def mkdir(self, path, mk_parent=True):
+    def mkdir(self, path, mk_parent=True, timeout=None, deadline=None):
         """Create a folder on server
 
         :param path: Folder path
         :param mk_parent: Whether to create the parent folder if not existed
+        :param timeout: Timeout of every try, default :attr:`timeout`
+        :param float deadline: Seconds the request may take in total, default
+                               :attr:`deadline`
         :rtype: :class:`~response.Response`
         """
-        url = self._get_url(path)
         headers = {}
         headers[const.HEADER_FOLDER] = 'create'
         if mk_parent:
             headers[const.HEADER_MKDIR] = 'true'
-        resp = self.session.post(url, headers=headers)
-        return response.Response(resp, self._get_file_url(path))
+        return self._request('POST', path, response.Response,
+                self._get_file_url(path), headers=headers, timeout=timeout,
+                deadline=deadline, op='mkdir')
 
-    def ls(self, path):
+    def ls(self, path, timeout=None, deadline=None):
         """List contents of a folder
 
         :param path: Path to the folder
+        :param timeout: Timeout of every try, default :attr:`timeout`
+        :param float deadline: Seconds the request may take in total, default
+                               :attr:`deadline`
         :rtype: :class:`~response.LsResponse`
         """
-        resp = self.session.get(self._get_url(path))
-        return response.LsResponse(resp, self._get_file_url(path))
+        return self._cached('ls', path, lambda: self._request('GET', path,
+            response.LsResponse, self._get_file_url(path), timeout=timeout,
+            deadline=deadline, op='ls'))
+
+    def walk(self, path, max_depth=None, workers=const.DEFAULT_WORKERS,
+            prefixes=None, onerror=None):
+        """Walk a folder tree, listing the subfolders concurrently, see
+        :func:`~tree.walk`
+
+        Usage::
+
+            for dirpath, folders, files in client.walk('/static'):
+                for f in files:
+                    print f.path, f.size
+
+        :param path: Path of the top folder
+        :param int max_depth: Max depth of the folders to list, the top
+                              folder is at depth 0
+        :param int workers: Number of folders listed concurrently
+        :param prefixes: Paths to walk below, other subtrees are pruned
+        :param onerror: Function called with ``(path, response)`` when
+                        listing a folder fails
+        :rtype: iterator of ``(dirpath, folders, files)``
+        """
+        return tree.walk(self, path, max_depth, workers, prefixes, onerror)
+
+    def sync(self, local_dir, remote_dir, manifest=None, delete=False,
+            dry_run=False, workers=const.DEFAULT_WORKERS):
+        """Upload the new and changed files of a local folder, tracked in a
+        local manifest, see :func:`~sync.sync`
+
+        Usage::
+
+            plan = client.sync('/srv/static', '/static', delete=True,
+                    dry_run=True)
+            print plan
+            plan.run()
+
+        :param str local_dir: Local folder
+        :param remote_dir: Folder on the server
+        :param manifest: :class:`~sync.Manifest` or the path of its database
+        :param bool delete: Whether to delete the files deleted locally
+        :param bool dry_run: Whether to only plan the changes
+        :param int workers: Number of worker threads
+        :rtype: :class:`~sync.SyncPlan`
+        """
+        return sync.sync(self, local_dir, remote_dir, manifest, delete,
+                dry_run, workers)
+
+    def mirror(self, remote_dir, local_dir, delete=False, dry_run=False,
+            workers=const.DEFAULT_WORKERS):
+        """Download the new and changed files of a folder to a local folder,
+        see :func:`~sync.mirror`
+
+        :param remote_dir: Folder on the server
+        :param str local_dir: Local folder
+        :param bool delete: Whether to delete the local files which are not
+                            on the server
+        :param bool dry_run: Whether to only plan the changes
+        :param int workers: Number of worker threads
+        :rtype: :class:`~sync.MirrorPlan`
+        """
+        return sync.mirror(self, remote_dir, local_dir, delete, dry_run,
+                workers)
 
-    def usage(self):
+    def usage(self, timeout=None, deadline=None):
         """Retrieve the space usage info
 
+        :param timeout: Timeout of every try, default :attr:`timeout`
+        :param float deadline: Seconds the request may take in total, default
+                               :attr:`deadline`
         :rtype: :class:`~response.UsageResponse`
         """
-        resp = self.session.get(self._get_url(''), params='usage')
-        return response.UsageResponse(resp, None)
+        return self._cached('usage', '', lambda: self._request('GET', '',
+            response.UsageResponse, None, timeout=timeout, deadline=deadline,
+            op='usage', params='usage'))
 
-    def info(self, path):
+    def info(self, path, timeout=None, deadline=None):
         """Retrieve file info
 
+        :param timeout: Timeout of every try, default :attr:`timeout`
+        :param float deadline: Seconds the request may take in total, default
+                               :attr:`deadline`
         :rtype: :class:`~response.InfoResponse`
         """
-        resp = self.session.head(self._get_url(path))
-        return response.InfoResponse(resp, self._get_file_url(path))
+        return self._cached('info', path, lambda: self._request('HEAD', path,
+            response.InfoResponse, self._get_file_url(path), timeout=timeout,
+            deadline=deadline, op='info', allow_redirects=False))
@@ -1,8 +1,26 @@
-import datetime
 import hashlib
+import time
+from email.utils import formatdate
 
 from requests.auth import AuthBase
 
+# (second, Date header) of the last second a request was signed in
+_date_cache = (None, None)
+
+
+def http_date(now=None):
+    """``Date`` header of a time, formatted once per wall clock second
+
+    :param float now: Seconds since the epoch, default the current time
+    :rtype: :class:`str`
+    """
+    global _date_cache
+    second = int(time.time() if now is None else now)
+    cached = _date_cache
+    if cached[0] != second:
+        cached = _date_cache = (second, formatdate(second, usegmt=True))
+    return cached[1]
+
 
 class UpYunDigestAuthentication(AuthBase):
     """UpYun signature digest authentication implemented for `requests`
@@ -15,6 +33,8 @@ class UpYunDigestAuthentication(AuthBase):
     def __init__(self, user, passwd):
         self.user = user
         self.passwd_digest = hashlib.md5(passwd).hexdigest()
+        self._suffix = '&' + self.passwd_digest
+        self._prefix = self.AUTH_STR + ' ' + user + ':'
 
     def _get_content_length(self, r):
         cont_len = r.headers.get('content-length', None)
@@ -24,19 +44,55 @@ class UpYunDigestAuthentication(AuthBase):
             return len(r.body)
         except (AttributeError, TypeError):
             pass
+        try:
+            return int(r.body.len)
+        except (AttributeError, TypeError):
+            pass
         try:
             return len(r.data)
         except (AttributeError, TypeError):
             pass
         return 0
 
+    def signature(self, method, path, date, content_length):
+        """Signature of a request from byte strings, without building the
+        headers
+
+        :param str method: HTTP method
+        :param str path: Quoted path of the request URL, with the query string
+        :param str date: ``Date`` header of the request
+        :param content_length: Length of the request body, :class:`str` as
+                               sent in the header, or :class:`int`
+        :rtype: :class:`str`
+        """
+        if not isinstance(content_length, str):
+            content_length = str(content_length)
+        return hashlib.md5('&'.join((method, path, date, content_length)) +
+                self._suffix).hexdigest()
+
+    def sign(self, method, path, content_length):
+        """Sign a request independent of the HTTP library sending it
+
+        :param str method: HTTP method
+        :param str path: Quoted path of the request URL, with the query string
+        :param content_length: Length of the request body, :class:`int` or
+                               :class:`str` as sent in the header
+        :returns: ``Date`` and ``Authorization`` headers to send
+        :rtype: :class:`dict`
+        """
+        date = http_date()
+        return {
+                'Date': date,
+                'Authorization': self._prefix + self.signature(method, path,
+                    date, content_length),
+                }
+
     def __call__(self, r):
-        datetime_str = datetime.datetime.utcnow().strftime(
-                '%a, %d %b %Y %H:%M:%S GMT')
-        sign_base = '&'.join((r.method, r.path_url, datetime_str,
-            str(self._get_content_length(r)), self.passwd_digest))
-        sign = hashlib.md5(sign_base).hexdigest()
-        r.headers['Date'] = datetime_str
-        r.headers['Authorization'] = \
-                self.AUTH_STR + ' ' + self.user + ':' + sign
+        # the header is already a string, skip the round trip through int
+        cont_len = r.headers.get('content-length', None)
+        if cont_len is None:
+            cont_len = self._get_content_length(r)
+        for name, value in self.sign(r.method, r.path_url,
+                cont_len).iteritems():
+            r.headers[name] = value
         return r
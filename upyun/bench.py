@@ -0,0 +1,217 @@
+"""Benchmarks of the hot paths of the client, run against a local
+:class:`~upyun.fakeserver.FakeUpYun`, the results are written as JSON so
+they can be compared between versions, the server shares the interpreter of
+the client so the numbers are meant to compare versions of the client rather
+than to predict the throughput against the service::
+
+    $ python -m upyun.bench -o before.json
+    $ python -m upyun.bench --quick put sign
+"""
+import json
+import optparse
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import requests
+
+from . import __version__, const, response, UpYun
+from .auth import http_date, UpYunDigestAuthentication
+from .fakeserver import FakeUpYun
+
+KB = 1024
+MB = 1024 * KB
+
+
+def _rss():
+    """Resident memory of the process in bytes, :class:`None` if unknown"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _timed(func, *args, **kwargs):
+    start = time.time()
+    result = func(*args, **kwargs)
+    return time.time() - start, result
+
+
+def bench_put(server, quick=False):
+    """Throughput of :meth:`~upyun.UpYun.put_many` by object size and
+    number of workers"""
+    sizes = (KB, 64 * KB, MB)
+    workers = (1, 4) if quick else (1, 4, 16)
+    total = 4 * MB if quick else 32 * MB
+    results = []
+    for size in sizes:
+        data = os.urandom(size)
+        count = max(min(total // size, 2000), workers[-1])
+        for n in workers:
+            client = server.client('bench')
+            items = (('/put/%d/%d' % (size, i), data) for i in xrange(count))
+            seconds, failed = _timed(lambda: sum(1 for _, resp in
+                client.put_many(items, workers=n)
+                if isinstance(resp, Exception) or not resp.success))
+            results.append({'size': size, 'workers': n, 'count': count,
+                'failed': failed, 'seconds': seconds,
+                'ops_per_second': count / seconds,
+                'mb_per_second': count * size / seconds / MB})
+    return results
+
+
+def bench_get(server, quick=False):
+    """Throughput of :meth:`~upyun.UpYun.get` buffered and streamed by
+    object size"""
+    sizes = (KB, MB) if quick else (KB, MB, 16 * MB)
+    total = 8 * MB if quick else 64 * MB
+    results = []
+    client = server.client('bench')
+    for size in sizes:
+        path = '/get/%d' % size
+        client.put(path, os.urandom(size))
+        count = max(min(total // size, 1000), 2)
+        for mode in ('buffered', 'stream'):
+            start = time.time()
+            for _ in xrange(count):
+                if mode == 'buffered':
+                    client.get(path).data
+                else:
+                    client.get_to_file(path, lambda chunk: None)
+            seconds = time.time() - start
+            results.append({'size': size, 'mode': mode, 'count': count,
+                'seconds': seconds, 'ops_per_second': count / seconds,
+                'mb_per_second': count * size / seconds / MB})
+    return results
+
+
+def _listing(n):
+    return '\n'.join('file-%07d.txt\t%s\t%d\t%d' % (i, 'F' if i % 10 == 0
+        else 'N', i * 7, 1360000000 + i) for i in xrange(n))
+
+
+def bench_listing(server=None, quick=False):
+    """Time and memory of parsing folder listings of 1k to 1M entries"""
+    counts = (1000, 10000) if quick else (1000, 10000, 100000, 1000000)
+    results = []
+    for n in counts:
+        r = requests.Response()
+        r.status_code = requests.codes.ok
+        r._content = _listing(n)
+        r._content_consumed = True
+        url = 'http://bench.b0.upaiyun.com/folder'
+        result = {'entries': n, 'bytes': len(r._content)}
+        for name, parse in (
+                ('stuffs', lambda resp: resp.stuffs),
+                ('iter_entries', lambda resp: sum(1 for _ in
+                    resp.iter_entries())),
+                ('compact', lambda resp: resp.compact())):
+            before = _rss()
+            seconds, parsed = _timed(parse, response.LsResponse(r, url))
+            after = _rss()
+            result[name + '_seconds'] = seconds
+            result[name + '_rss_delta'] = None if before is None else \
+                    after - before
+            del parsed
+        results.append(result)
+    return results
+
+
+def bench_sign(server=None, quick=False):
+    """Cost of signing a request with
+    :class:`~upyun.auth.UpYunDigestAuthentication`, through the `requests`
+    hook and through the byte string signature alone"""
+    count = 20000 if quick else 200000
+    auth = UpYunDigestAuthentication('bench', 'bench')
+    r = requests.Request('PUT', 'http://v0.api.upyun.com/bench/path/file.txt',
+            data='x' * 100).prepare()
+    results = []
+    for name, sign in (
+            ('request', lambda: auth(r)),
+            ('signature', lambda: auth.signature('PUT', '/bench/path/file.txt',
+                http_date(), '100'))):
+        seconds, _ = _timed(lambda: [sign() for _ in xrange(count)])
+        results.append({'path': name, 'count': count, 'seconds': seconds,
+            'us_per_request': seconds / count * 1e6})
+    return results
+
+
+def bench_startup(server=None, quick=False):
+    """Time to import the package in a new interpreter and to build a
+    client"""
+    count = 100 if quick else 1000
+    imports = []
+    for _ in xrange(3 if quick else 10):
+        out = subprocess.Popen([sys.executable, '-c', 'import time; '
+            't = time.time(); import upyun; print time.time() - t'],
+            stdout=subprocess.PIPE,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            ).communicate()[0]
+        imports.append(float(out))
+    seconds, _ = _timed(lambda: [UpYun('bench', ('bench', 'bench'),
+        const.SPACE_TYPE_FILE) for _ in xrange(count)])
+    return [{'import_seconds': min(imports),
+        'construct_us': seconds / count * 1e6}]
+
+
+#: Benchmarks by name
+BENCHMARKS = {
+        'put': bench_put,
+        'get': bench_get,
+        'listing': bench_listing,
+        'sign': bench_sign,
+        'startup': bench_startup,
+        }
+
+
+def run(names=None, quick=False, **server_options):
+    """Run benchmarks against a new :class:`~upyun.fakeserver.FakeUpYun`
+
+    :param names: Names of the benchmarks in :data:`BENCHMARKS`, default all
+    :param bool quick: Whether to run smaller workloads
+    :param server_options: Arguments of the server, like ``latency`` or
+                           ``bandwidth``
+    :returns: Results, serializable as JSON
+    :rtype: :class:`dict`
+    """
+    names = names or sorted(BENCHMARKS)
+    results = {}
+    with FakeUpYun(**server_options) as server:
+        for name in names:
+            results[name] = BENCHMARKS[name](server, quick)
+    return {'version': __version__, 'python': platform.python_version(),
+            'requests': requests.__version__, 'platform': platform.platform(),
+            'time': time.time(), 'quick': quick,
+            'server': server_options, 'results': results}
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options] [benchmark ...]',
+            description='Benchmarks: ' + ', '.join(sorted(BENCHMARKS)))
+    parser.add_option('-o', '--output', help='file to write the JSON to, '
+            'default stdout')
+    parser.add_option('-q', '--quick', action='store_true',
+            help='run smaller workloads')
+    parser.add_option('--latency', type='float', default=0,
+            help='seconds the server waits before answering')
+    parser.add_option('--bandwidth', type='int',
+            help='bytes per second the server sends and receives at')
+    options, names = parser.parse_args(argv)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error('unknown benchmarks: ' + ', '.join(sorted(unknown)))
+    results = run(names, options.quick, latency=options.latency,
+            bandwidth=options.bandwidth)
+    out = json.dumps(results, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(out + '\n')
+    else:
+        print out
+
+
+if __name__ == '__main__':
+    main()
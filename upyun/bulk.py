@@ -0,0 +1,178 @@
+import Queue
+import threading
+import time
+
+_STOP = object()
+_DONE = object()
+
+
+class BulkStats(object):
+    """Aggregate statistics of a bulk operation"""
+    def __init__(self):
+        #: Start time of the operation
+        self.started = time.time()
+
+        #: End time of the operation, :class:`None` if not finished
+        self.finished = None
+
+        #: Number of items finished
+        self.done = 0
+
+        #: Number of items failed, either unsuccessful or raised an error
+        self.failed = 0
+
+        #: Number of bytes transferred
+        self.bytes = 0
+
+        self._lock = threading.Lock()
+
+    def _add(self, failed, size):
+        with self._lock:
+            self.done += 1
+            if failed:
+                self.failed += 1
+            self.bytes += size
+
+    @property
+    def elapsed(self):
+        """Seconds elapsed since the operation started"""
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def rate(self):
+        """Items finished per second"""
+        elapsed = self.elapsed
+        return self.done / elapsed if elapsed else 0.0
+
+    @property
+    def throughput(self):
+        """Bytes transferred per second"""
+        elapsed = self.elapsed
+        return self.bytes / elapsed if elapsed else 0.0
+
+
+class Bulk(object):
+    """Run a function over the items of an iterable in a pool of worker
+    threads, iterating yields ``(key, result)`` pairs in the order the items
+    finish, where ``result`` is the return value of the function or the
+    exception it raised
+
+    The items are taken from the iterable lazily, at most ``backlog`` items
+    are taken ahead of the workers and at most ``backlog`` results wait to be
+    iterated, the workers wait for a slow consumer, so a generator of any
+    length is never materialized.
+
+    :param func: Function to call with every item
+    :param items: Iterable of items
+    :param int workers: Number of worker threads
+    :param int backlog: Max number of items waiting for a free worker, and
+                        of results waiting to be iterated, default twice the
+                        number of workers
+    :param key: Function to get the key of an item, default the item itself
+    :param size: Function to get the bytes transferred from a result, used
+                 for :attr:`stats`
+    """
+    def __init__(self, func, items, workers, backlog=None, key=None,
+            size=None):
+        self.func = func
+        self.workers = workers
+        self.key = key or (lambda item: item)
+        self.size = size
+
+        #: :class:`BulkStats` of the operation
+        self.stats = BulkStats()
+
+        self._tasks = Queue.Queue(backlog or workers * 2)
+        # room for a result of every worker, which may be put after close()
+        # drained the queue
+        self._results = Queue.Queue(max(backlog or workers * 2, workers))
+        self._closed = False
+        self._error = None
+        self._alive = workers
+
+        feeder = threading.Thread(target=self._feed, args=(items,))
+        feeder.daemon = True
+        feeder.start()
+        for _ in xrange(workers):
+            t = threading.Thread(target=self._work)
+            t.daemon = True
+            t.start()
+
+    def _feed(self, items):
+        try:
+            for item in items:
+                if self._closed:
+                    break
+                self._tasks.put(item)
+        except Exception as e:
+            self._error = e
+        finally:
+            for _ in xrange(self.workers):
+                self._tasks.put(_STOP)
+
+    def _work(self):
+        try:
+            while True:
+                item = self._tasks.get()
+                if item is _STOP:
+                    break
+                if self._closed:
+                    continue
+                try:
+                    result = self.func(item)
+                except Exception as e:
+                    result = e
+                self._put_result((self.key(item), result))
+        finally:
+            self._put_result(_DONE)
+
+    def _put_result(self, result):
+        # nobody takes the results once closed
+        if not self._closed:
+            self._results.put(result)
+
+    def _failed(self, result):
+        return isinstance(result, Exception) or \
+                not getattr(result, 'success', True)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        while self._alive and not self._closed:
+            r = self._results.get()
+            if r is _DONE:
+                self._alive -= 1
+                continue
+            key, result = r
+            failed = self._failed(result)
+            size = 0
+            if self.size and not failed:
+                size = self.size(result) or 0
+            self.stats._add(failed, size)
+            return key, result
+        if self.stats.finished is None:
+            self.stats.finished = time.time()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+        raise StopIteration
+
+    def close(self):
+        """Stop taking new items, the items already running are finished in
+        the background and the results not iterated yet are discarded"""
+        self._closed = True
+        while True:
+            try:
+                self._results.get_nowait()
+            except Queue.Empty:
+                break
+
+    def wait(self):
+        """Run the operation to the end, discarding the results
+
+        :rtype: :class:`BulkStats`
+        """
+        for _ in self:
+            pass
+        return self.stats
@@ -0,0 +1,365 @@
+from email.utils import mktime_tz, parsedate_tz
+import hashlib
+import json
+import os
+import posixpath
+import re
+import tempfile
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from . import const
+
+
+# names of the files written by a ContentCache: the md5 of the key, its
+# metadata and the temporary files of both
+_CACHE_FILE = re.compile(r'^[0-9a-f]{32}(\.json)?(\..+\.tmp)?$')
+
+
+def _normpath(path):
+    return posixpath.normpath('/' + path.strip('/'))
+
+
+class LRUCache(object):
+    """A mapping bounded to ``maxsize`` entries which evicts the least
+    recently used entry, entries expire after their TTL
+
+    :param int maxsize: Max number of entries, or max total weight
+    :param weigh: Function returning the weight of a value, by default every
+                  entry weighs 1
+    :param on_evict: Function called with ``(key, value)`` when an entry is
+                     evicted to make room
+    """
+    def __init__(self, maxsize, weigh=None, on_evict=None):
+        self.maxsize = maxsize
+        self.weigh = weigh
+        self.on_evict = on_evict
+
+        #: Total weight of the entries
+        self.weight = 0
+
+        self._map = {}
+        # circular doubly linked list of
+        # [prev, next, key, value, expires, weight]
+        self._root = root = []
+        root[:] = [root, root, None, None, None, 0]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._map)
+
+    def _unlink(self, node):
+        node[0][1], node[1][0] = node[1], node[0]
+
+    def _remove(self, node):
+        self._unlink(node)
+        del self._map[node[2]]
+        self.weight -= node[5]
+
+    def _link_last(self, node):
+        root = self._root
+        last = root[0]
+        node[0], node[1] = last, root
+        last[1] = root[0] = node
+
+    def get(self, key, default=None):
+        """Get a live entry and mark it as recently used"""
+        with self._lock:
+            node = self._map.get(key)
+            if node is None:
+                return default
+            if node[4] <= time.time():
+                self._remove(node)
+                return default
+            self._unlink(node)
+            self._link_last(node)
+            return node[3]
+
+    def set(self, key, value, ttl):
+        """Set an entry expiring after ``ttl`` seconds"""
+        weight = 1 if self.weigh is None else self.weigh(value)
+        evicted = []
+        with self._lock:
+            node = self._map.get(key)
+            if node is not None:
+                self._remove(node)
+            node = [None, None, key, value, time.time() + ttl, weight]
+            self._link_last(node)
+            self._map[key] = node
+            self.weight += weight
+            limit = len(self._map) if self.weigh is None else self.weight
+            while limit > self.maxsize:
+                oldest = self._root[1]
+                self._remove(oldest)
+                evicted.append(oldest)
+                limit = len(self._map) if self.weigh is None else \
+                        self.weight
+        if self.on_evict is not None:
+            for node in evicted:
+                self.on_evict(node[2], node[3])
+
+    def pop(self, key):
+        """Remove an entry if it exists and return its value"""
+        with self._lock:
+            node = self._map.get(key)
+            if node is not None:
+                self._remove(node)
+                return node[3]
+
+    def clear(self):
+        with self._lock:
+            self._map.clear()
+            self.weight = 0
+            root = self._root
+            root[:] = [root, root, None, None, None, 0]
+
+
+class MetadataCache(object):
+    """Cache of the responses of :meth:`~upyun.UpYun.info`,
+    :meth:`~upyun.UpYun.ls` and :meth:`~upyun.UpYun.usage`
+
+    A ``404`` of ``info`` or ``ls`` is cached for ``negative_ttl``, other
+    failures are not cached. Changes made through a client using the cache
+    invalidate the entries of the path and of its parent folders.
+
+    :param int maxsize: Max number of responses cached
+    :param float info_ttl: Seconds to cache ``info``
+    :param float ls_ttl: Seconds to cache ``ls``
+    :param float usage_ttl: Seconds to cache ``usage``
+    :param float negative_ttl: Seconds to cache a ``404``
+    """
+    OPERATIONS = ('info', 'ls', 'usage')
+
+    def __init__(self, maxsize=10000, info_ttl=60, ls_ttl=30, usage_ttl=60,
+            negative_ttl=10):
+        self.ttls = {'info': info_ttl, 'ls': ls_ttl, 'usage': usage_ttl}
+        self.negative_ttl = negative_ttl
+
+        #: Number of lookups answered from the cache
+        self.hits = 0
+
+        #: Number of lookups not in the cache
+        self.misses = 0
+
+        self._cache = LRUCache(maxsize)
+
+    def get(self, op, path):
+        """Get the cached response of an operation on a path
+
+        :rtype: :class:`~upyun.response.ResponseBase` or :class:`None`
+        """
+        resp = self._cache.get((op, _normpath(path)))
+        if resp is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return resp
+
+    def set(self, op, path, resp):
+        """Cache the response of an operation on a path if it is cacheable"""
+        if resp.success:
+            ttl = self.ttls[op]
+        elif resp.response.status_code == requests.codes.not_found:
+            ttl = self.negative_ttl
+        else:
+            return
+        if ttl > 0:
+            self._cache.set((op, _normpath(path)), resp, ttl)
+
+    def invalidate(self, path):
+        """Invalidate the entries of a changed path, of its parent folders,
+        and the usage of the space"""
+        path = _normpath(path)
+        while True:
+            self._cache.pop(('info', path))
+            self._cache.pop(('ls', path))
+            if path == '/':
+                break
+            path = posixpath.dirname(path)
+        self._cache.pop(('usage', '/'))
+
+    def clear(self):
+        """Remove all the entries"""
+        self._cache.clear()
+
+
+class ContentCache(object):
+    """Cache of the files downloaded by :meth:`~upyun.UpYun.get`, in memory
+    or in a local folder, bounded to ``max_bytes`` of data
+
+    A cached file is revalidated before it is served: with a conditional
+    ``GET`` carrying ``If-None-Match`` and ``If-Modified-Since``, which costs
+    a ``304`` if the file is unchanged, or with ``head`` by comparing the
+    ``x-upyun-file-date`` and size returned by :meth:`~upyun.UpYun.info`.
+    Within ``max_age`` of its last validation a file is served without a
+    request. Changes made through a client using the cache invalidate the
+    file.
+
+    :param int max_bytes: Max total size of the files cached
+    :param str path: Folder to keep the files in, the files cached there
+                     before are loaded, other files in the folder are left
+                     alone, by default the files are kept in memory
+    :param float max_age: Seconds to serve a file without revalidating it
+    :param bool head: Whether to revalidate with ``HEAD`` requests instead of
+                      conditional requests
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024, path=None, max_age=0,
+            head=False):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.max_age = max_age
+        self.head = head
+
+        #: Number of files served from the cache, revalidated or not
+        self.hits = 0
+
+        #: Number of files downloaded
+        self.misses = 0
+
+        #: Number of revalidation requests sent
+        self.revalidations = 0
+
+        if path is None:
+            self._cache = LRUCache(max_bytes, weigh=lambda v: len(v[1]))
+        else:
+            self._cache = LRUCache(max_bytes, weigh=lambda v: v['length'],
+                    on_evict=lambda key, meta: self._unlink(key))
+            self._load()
+
+    def _file(self, key):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        return os.path.join(self.path, hashlib.md5(key).hexdigest())
+
+    def _unlink(self, key):
+        for name in (self._file(key), self._file(key) + '.json'):
+            try:
+                os.remove(name)
+            except OSError:
+                pass
+
+    def _write(self, name, data):
+        fd, tmp = tempfile.mkstemp(prefix=os.path.basename(name) + '.',
+                suffix='.tmp', dir=self.path)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.rename(tmp, name)
+
+    def _load(self):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        metas = []
+        for name in os.listdir(self.path):
+            if not (name.endswith('.json') and _CACHE_FILE.match(name)):
+                continue
+            filename = os.path.join(self.path, name)
+            try:
+                with open(filename) as f:
+                    meta = json.load(f)
+                meta['key'] = meta['key'].encode('utf-8')
+                mtime = os.path.getmtime(filename)
+            except (OSError, ValueError, TypeError, KeyError, AttributeError):
+                continue
+            # metadata of another key, or not written by the cache
+            if os.path.basename(self._file(meta['key'])) + '.json' == name:
+                metas.append((mtime, meta))
+        # least recently stored first, so they are evicted first
+        for _, meta in sorted(metas):
+            self._cache.set(meta['key'], meta, float('inf'))
+
+    def _lookup(self, key):
+        value = self._cache.get(key)
+        if value is None or self.path is None:
+            return value
+        try:
+            with open(self._file(key), 'rb') as f:
+                return value, f.read()
+        except IOError:
+            self._cache.pop(key)
+
+    def lookup(self, path):
+        """Get the cached file of a path
+
+        :returns: ``(meta, data)`` or :class:`None`, ``meta`` is a
+                  :class:`dict` of the ``headers`` of the response and of
+                  the ``checked`` time of the last validation
+        """
+        return self._lookup(_normpath(path))
+
+    def fresh(self, meta):
+        """Whether a cached file can be served without revalidating it"""
+        return time.time() - meta['checked'] < self.max_age
+
+    def validated(self, meta):
+        """Record that a cached file was revalidated"""
+        meta['checked'] = time.time()
+
+    def conditional_headers(self, meta):
+        """Headers of a conditional request revalidating a cached file"""
+        headers = {}
+        etag = meta['headers'].get('etag')
+        if etag:
+            headers['If-None-Match'] = etag
+        last_modified = meta['headers'].get('last-modified')
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def matches(self, meta, info):
+        """Whether the :class:`~upyun.response.InfoResponse` of a path
+        matches its cached file"""
+        date = info._get_header_with_prefix('file-date')
+        return date is not None and meta['file_date'] is not None and \
+                date == str(meta['file_date']) and \
+                info.size == meta['length']
+
+    def store(self, path, resp):
+        """Cache a successfully downloaded file, the cached file of a path not
+        found is removed"""
+        if resp.response.status_code == requests.codes.not_found:
+            self.invalidate(path)
+        data = resp.data
+        if not resp.success or len(data) > self.max_bytes:
+            return
+        headers = dict((k.lower(), v) for k, v in
+                resp.response.headers.items())
+        file_date = headers.get(const.HEADER_UPYUN_PREFIX + 'file-date')
+        if file_date is None and headers.get('last-modified'):
+            parsed = parsedate_tz(headers['last-modified'])
+            file_date = parsed and mktime_tz(parsed)
+        key = _normpath(path)
+        meta = {'key': key, 'headers': headers, 'length': len(data),
+                'file_date': file_date, 'checked': time.time()}
+        if self.path is None:
+            self._cache.set(key, (meta, data), float('inf'))
+            return
+        self._write(self._file(key), data)
+        self._write(self._file(key) + '.json', json.dumps(meta))
+        self._cache.set(key, meta, float('inf'))
+
+    def response(self, meta, data):
+        """Build a :class:`requests.Response` serving a cached file"""
+        r = requests.Response()
+        r.status_code = requests.codes.ok
+        r.headers = CaseInsensitiveDict(meta['headers'])
+        r._content = data
+        r._content_consumed = True
+        return r
+
+    def invalidate(self, path):
+        """Remove the cached file of a changed path"""
+        key = _normpath(path)
+        if self._cache.pop(key) is not None and self.path is not None:
+            self._unlink(key)
+
+    def clear(self):
+        """Remove all the cached files, the other files of :attr:`path` are
+        kept"""
+        self._cache.clear()
+        if self.path is not None:
+            for name in os.listdir(self.path):
+                if _CACHE_FILE.match(name):
+                    os.remove(os.path.join(self.path, name))
@@ -14,6 +14,13 @@ SPACE_TYPE_IMAGE = 2
 
 BUCKET_DOMAIN = '%s.b0.upaiyun.com'
 
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_WORKERS = 8
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
 HEADER_UPYUN_PREFIX = 'x-upyun-'
 HEADER_THUMB_PREFIX = 'x-gmkerl-'
 HEADER_THUMB_VERSION = HEADER_THUMB_PREFIX + 'thumbnail'
@@ -25,6 +32,32 @@ HEADER_MKDIR = 'Mkdir'
 HEADER_MD5 = 'Content-MD5'
 HEADER_SECRET = 'Content-Secret'
 HEADER_FOLDER = 'Folder'
+HEADER_MULTI_STAGE = HEADER_UPYUN_PREFIX + 'multi-stage'
+HEADER_MULTI_UUID = HEADER_UPYUN_PREFIX + 'multi-uuid'
+HEADER_MULTI_LENGTH = HEADER_UPYUN_PREFIX + 'multi-length'
+HEADER_MULTI_TYPE = HEADER_UPYUN_PREFIX + 'multi-type'
+HEADER_MULTI_DISORDER = HEADER_UPYUN_PREFIX + 'multi-disorder'
+HEADER_MULTI_MD5 = HEADER_UPYUN_PREFIX + 'multi-md5'
+HEADER_PART_ID = HEADER_UPYUN_PREFIX + 'part-id'
+HEADER_NEXT_PART_ID = HEADER_UPYUN_PREFIX + 'next-part-id'
+
+MULTI_STAGE_INITIATE = 'initiate'
+MULTI_STAGE_UPLOAD = 'upload'
+MULTI_STAGE_COMPLETE = 'complete'
+
+#: Parts of a resumable upload must be a multiple of it, except the last one
+MULTIPART_UNIT = 1024 * 1024
+DEFAULT_PART_SIZE = 4 * MULTIPART_UNIT
+
+#: Segments of a segmented download are not split smaller than it
+MIN_SEGMENT_SIZE = 1024 * 1024
+DEFAULT_SEGMENTS = 8
+
+#: Seconds a signed upload policy or download URL is valid for
+DEFAULT_PRESIGN_EXPIRES = 600
+
+SYNC_MANIFEST = '.upyun-manifest'
+MIRROR_TEMP_PREFIX = '.upyun-tmp-'
 
 THUMB_TYPE_FIX_MAX = 1
 THUMB_TYPE_FIX_WIDTH_OR_HEIGHT = 2
@@ -0,0 +1,401 @@
+import BaseHTTPServer
+from email.utils import formatdate, mktime_tz, parsedate_tz
+import hashlib
+import random
+import socket
+import SocketServer
+import struct
+import threading
+import time
+import urllib
+import urlparse
+import uuid
+
+from . import const, UpYun
+from .hosts import HostSelector
+
+
+def _image_info(data):
+    """``(width, height, frames, type)`` of a GIF or PNG image"""
+    if data[:6] in ('GIF87a', 'GIF89a') and len(data) >= 10:
+        width, height = struct.unpack('<HH', data[6:10])
+        return width, height, max(data.count('\x21\xf9\x04'), 1), 'GIF'
+    if data[:8] == '\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        width, height = struct.unpack('>II', data[16:24])
+        return width, height, 1, 'PNG'
+
+
+def _mkdir(headers):
+    return headers.get(const.HEADER_MKDIR, '').lower() == 'true'
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def log_message(self, *args):
+        pass
+
+    def _throttle(self, start, size):
+        bandwidth = self.server.fake.bandwidth
+        if bandwidth:
+            wait = float(size) / bandwidth - (time.time() - start)
+            if wait > 0:
+                time.sleep(wait)
+
+    def _read(self, size):
+        chunks, left, start = [], size, time.time()
+        while left > 0:
+            chunk = self.rfile.read(min(left, const.DEFAULT_CHUNK_SIZE))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            left -= len(chunk)
+            self._throttle(start, size - left)
+        return ''.join(chunks)
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(';')[0], 16)
+                if not size:
+                    self.rfile.readline()
+                    return ''.join(chunks)
+                chunks.append(self._read(size))
+                self.rfile.readline()
+        return self._read(int(self.headers.get('Content-Length') or 0))
+
+    def _reply(self, status, body='', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).iteritems():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+        start = time.time()
+        for offset in xrange(0, len(body), const.DEFAULT_CHUNK_SIZE):
+            self.wfile.write(body[offset:offset + const.DEFAULT_CHUNK_SIZE])
+            if self.server.fake.bandwidth:
+                self.wfile.flush()
+                self._throttle(start, offset + const.DEFAULT_CHUNK_SIZE)
+
+    def _handle(self):
+        body = self._read_body()
+        self._reply(*self.server.fake._handle(self.command, self.path,
+            self.headers, body))
+
+    do_PUT = do_GET = do_HEAD = do_DELETE = do_POST = _handle
+
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, *args, **kwargs):
+        BaseHTTPServer.HTTPServer.__init__(self, *args, **kwargs)
+        self.connections = set()
+
+    def process_request(self, request, client_address):
+        self.connections.add(request)
+        SocketServer.ThreadingMixIn.process_request(self, request,
+                client_address)
+
+    def shutdown_request(self, request):
+        self.connections.discard(request)
+        BaseHTTPServer.HTTPServer.shutdown_request(self, request)
+
+
+class FakeUpYun(object):
+    """An in-process server speaking the UpYun REST API, for tests and
+    benchmarks without the service
+
+    The files are kept in memory. It serves ``PUT`` with ``Content-MD5`` and
+    the resumable upload stages, ``GET`` with ranges, conditional requests,
+    the folder listings and ``?usage``, ``HEAD``, ``DELETE`` and the ``POST``
+    creating a folder. The signature of every request is verified against
+    ``accounts``. Latency, bandwidth and errors can be injected, and changed
+    while the server runs.
+
+    Usage::
+
+        with FakeUpYun(latency=0.05, error_rate=0.1, seed=1) as server:
+            client = server.client('bucket')
+            client.put('/test.txt', 'hello')
+
+    :param accounts: :class:`dict` of ``user: password`` allowed, default
+                     ``{'test': 'test'}``
+    :param float latency: Seconds to wait before answering a request
+    :param int bandwidth: Bytes per second a request and a response are sent
+                          at, ``None`` for no limit
+    :param float error_rate: Share of the requests answered with
+                             ``error_status``, from 0 to 1
+    :param int error_status: Status code of the injected errors
+    :param seed: Seed of the random injected errors
+    :param str host: Address to listen on
+    :param int port: Port to listen on, by default a free port
+    """
+    def __init__(self, accounts=None, latency=0, bandwidth=None,
+            error_rate=0, error_status=503, seed=None, host='127.0.0.1',
+            port=0):
+        self.accounts = {'test': 'test'} if accounts is None else accounts
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+        #: Number of requests received
+        self.requests = 0
+
+        #: Number of errors injected
+        self.errors = 0
+
+        # path: (data, mtime)
+        self._files = {}
+        # path: [mtime, {name: None}]
+        self._folders = {}
+        # uuid: (path, length, {part id: data})
+        self._uploads = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def host(self):
+        """``host:port`` the server listens on"""
+        return '%s:%d' % self._server.server_address
+
+    def start(self):
+        """Serve in a daemon thread"""
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the kept alive connections"""
+        if self._thread is not None:
+            self._server.shutdown()
+        self._server.server_close()
+        for conn in list(self._server.connections):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        # let the handlers finish before the interpreter may exit
+        deadline = time.time() + 1
+        while self._server.connections and time.time() < deadline:
+            time.sleep(0.01)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def client(self, bucket, stype=const.SPACE_TYPE_FILE, user=None,
+            **kwargs):
+        """Build a :class:`~upyun.UpYun` client sending its requests to the
+        server, through a :class:`~hosts.HostSelector` of its host
+
+        :param str bucket: Bucket, created on the first use
+        :param stype: Space type
+        :param str user: User, default any of ``accounts``
+        :param kwargs: Other arguments of :class:`~upyun.UpYun`
+        """
+        user = user or next(iter(self.accounts))
+        kwargs.setdefault('host_selector', HostSelector([self.host]))
+        return UpYun(bucket, (user, self.accounts[user]), stype, **kwargs)
+
+    def _check_auth(self, method, uri, headers):
+        try:
+            scheme, credentials = headers['Authorization'].split(' ', 1)
+            user, sign = credentials.split(':', 1)
+            passwd = self.accounts[user]
+        except (KeyError, ValueError):
+            return False
+        expected = hashlib.md5('&'.join((method, uri,
+            headers.get('Date', ''), headers.get('Content-Length') or '0',
+            hashlib.md5(passwd).hexdigest()))).hexdigest()
+        return scheme == 'UpYun' and sign == expected
+
+    def _handle(self, method, uri, headers, body):
+        with self._lock:
+            self.requests += 1
+            error = self.error_rate and \
+                    self._random.random() < self.error_rate
+            if error:
+                self.errors += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if error:
+            return self.error_status, 'injected error'
+        if not self._check_auth(method, uri, headers):
+            return 401, 'sign error'
+        url = urlparse.urlparse(uri)
+        path = '/' + urllib.unquote(url.path).strip('/')
+        if path == '/':
+            return 404, 'bucket not found'
+        with self._lock:
+            return getattr(self, '_' + method.lower())(path, url.query,
+                    headers, body)
+
+    def _is_folder(self, path):
+        # a bucket exists once used
+        return path in self._folders or path.count('/') == 1
+
+    def _makedirs(self, path, now):
+        parts = path.strip('/').split('/')
+        for i in xrange(1, len(parts) + 1):
+            folder = '/' + '/'.join(parts[:i])
+            if folder not in self._folders:
+                self._folders[folder] = [now, {}]
+                if i > 1:
+                    self._folders['/' + '/'.join(parts[:i - 1])][1][
+                            parts[i - 1]] = None
+
+    def _parent(self, path, mkdir, now):
+        """Create the parent folder of a path if allowed, whether it
+        exists"""
+        parent = path.rsplit('/', 1)[0]
+        if not (mkdir or self._is_folder(parent)):
+            return False
+        self._makedirs(parent, now)
+        return True
+
+    def _store(self, path, data, mkdir):
+        now = int(time.time())
+        if self._is_folder(path):
+            return 400, 'path is a folder'
+        if not self._parent(path, mkdir, now):
+            return 404, 'folder not found'
+        parent, name = path.rsplit('/', 1)
+        self._folders[parent][1][name] = None
+        self._files[path] = (data, now)
+        reply = {}
+        image = _image_info(data)
+        if image is not None:
+            for name, value in zip(('width', 'height', 'frames', 'file-type'),
+                    image):
+                reply[const.HEADER_UPYUN_PREFIX + name] = str(value)
+        return 200, '', reply
+
+    def _put(self, path, query, headers, body):
+        md5 = headers.get(const.HEADER_MD5)
+        if md5 and md5.lower() != hashlib.md5(body).hexdigest():
+            return 406, 'md5 mismatch'
+        stage = headers.get(const.HEADER_MULTI_STAGE)
+        if stage == const.MULTI_STAGE_INITIATE:
+            upload = uuid.uuid4().hex
+            self._uploads[upload] = (path,
+                    int(headers.get(const.HEADER_MULTI_LENGTH) or 0), {})
+            return 204, '', {const.HEADER_MULTI_UUID: upload,
+                    const.HEADER_NEXT_PART_ID: '0'}
+        if stage in (const.MULTI_STAGE_UPLOAD, const.MULTI_STAGE_COMPLETE):
+            upload = self._uploads.get(headers.get(const.HEADER_MULTI_UUID))
+            if upload is None or upload[0] != path:
+                return 404, 'upload not found'
+            parts = upload[2]
+            if stage == const.MULTI_STAGE_UPLOAD:
+                parts[int(headers[const.HEADER_PART_ID])] = body
+                next_id = 0
+                while next_id in parts:
+                    next_id += 1
+                return 204, '', {const.HEADER_NEXT_PART_ID: str(next_id)}
+            data = ''.join(parts[i] for i in sorted(parts))
+            if len(data) != upload[1] or sorted(parts) != range(len(parts)):
+                return 400, 'parts missing'
+            md5 = headers.get(const.HEADER_MULTI_MD5)
+            if md5 and md5.lower() != hashlib.md5(data).hexdigest():
+                return 406, 'md5 mismatch'
+            del self._uploads[headers[const.HEADER_MULTI_UUID]]
+            # the parent folders of a resumable upload are always created
+            return self._store(path, data, True)
+        return self._store(path, body, _mkdir(headers))
+
+    def _get(self, path, query, headers, body):
+        if query == 'usage':
+            bucket = path + '/'
+            return 200, str(sum(len(data) for p, (data, _) in
+                self._files.iteritems() if p.startswith(bucket)))
+        if path in self._files:
+            return self._get_file(path, headers)
+        if not self._is_folder(path):
+            return 404, 'file or folder not found'
+        rows = []
+        mtime, names = self._folders.get(path, (0, {}))
+        for name in sorted(names):
+            child = path + '/' + name
+            if child in self._files:
+                data, mtime = self._files[child]
+                rows.append('%s\tN\t%d\t%d' % (name, len(data), mtime))
+            else:
+                rows.append('%s\tF\t0\t%d' % (name, self._folders[child][0]))
+        return 200, '\n'.join(rows)
+
+    def _get_file(self, path, headers):
+        data, mtime = self._files[path]
+        reply = {'ETag': '"%s"' % hashlib.md5(data).hexdigest(),
+                'Last-Modified': formatdate(mtime, usegmt=True)}
+        if 'If-None-Match' in headers:
+            if headers['If-None-Match'] == reply['ETag']:
+                return 304, '', reply
+        elif 'If-Modified-Since' in headers:
+            since = parsedate_tz(headers['If-Modified-Since'])
+            if since and mtime <= mktime_tz(since):
+                return 304, '', reply
+        byte_range = headers.get('Range', '')
+        if byte_range.startswith('bytes='):
+            start, _, end = byte_range[6:].partition('-')
+            try:
+                start = int(start)
+                end = min(int(end) if end else len(data) - 1, len(data) - 1)
+            except ValueError:
+                start = end = -1
+            if not 0 <= start <= end:
+                return 416, 'range not satisfiable', {
+                        'Content-Range': 'bytes */%d' % len(data)}
+            reply['Content-Range'] = 'bytes %d-%d/%d' % (start, end,
+                    len(data))
+            return 206, data[start:end + 1], reply
+        return 200, data, reply
+
+    def _head(self, path, query, headers, body):
+        prefix = const.HEADER_UPYUN_PREFIX
+        if path in self._files:
+            data, mtime = self._files[path]
+            return 200, '', {prefix + 'file-type': 'file',
+                    prefix + 'file-size': str(len(data)),
+                    prefix + 'file-date': str(mtime)}
+        if self._is_folder(path):
+            mtime = self._folders.get(path, (0,))[0]
+            return 200, '', {prefix + 'file-type': 'folder',
+                    prefix + 'file-date': str(mtime)}
+        return 404, ''
+
+    def _delete(self, path, query, headers, body):
+        if path in self._folders:
+            if self._folders[path][1]:
+                return 403, 'folder not empty'
+            del self._folders[path]
+        elif self._files.pop(path, None) is None:
+            return 404, 'file or folder not found'
+        parent, name = path.rsplit('/', 1)
+        if parent in self._folders:
+            self._folders[parent][1].pop(name, None)
+        return 200, ''
+
+    def _post(self, path, query, headers, body):
+        if headers.get(const.HEADER_FOLDER, '').lower() != 'create':
+            return 400, 'bad request'
+        now = int(time.time())
+        if path in self._files:
+            return 400, 'path is a file'
+        if not self._parent(path, _mkdir(headers), now):
+            return 404, 'folder not found'
+        self._makedirs(path, now)
+        return 200, ''
@@ -0,0 +1,89 @@
+import threading
+import time
+
+import requests
+
+from . import const
+
+
+class HostSelector(object):
+    """Route the requests to the API host with the lowest measured latency
+
+    An exponentially weighted moving average of the round trip time and of
+    the error rate is kept for every host. The round trip time is the time to
+    the response headers of the probes and of the requests without a body,
+    or the time to connect for a request sending a body, so the size of a
+    transfer does not count against a host. The score of a host is
+    ``rtt + error_penalty * error_rate`` and the host with the lowest score
+    is selected. Hosts not measured yet score zero, so each of them is tried
+    once. A host failing with connection errors or server errors is scored
+    down, so the retries of the request fail over to another host.
+
+    :param hosts: API hosts to select from, default all of
+                  :const:`~const.UPAIYUN_API_HOSTS`, a host may carry a port
+    :param float alpha: Weight of a new sample in the averages, from 0 to 1
+    :param float error_penalty: Seconds added to the score of a host which
+                                always fails
+    """
+    def __init__(self, hosts=None, alpha=0.3, error_penalty=1.0):
+        if hosts is None:
+            hosts = [const.UPAIYUN_API_HOSTS[h] for h in (const.API_HOST_AUTO,
+                const.API_HOST_TELECOM, const.API_HOST_NETCOM,
+                const.API_HOST_RAILCOM)]
+        self.hosts = list(hosts)
+        self.alpha = alpha
+        self.error_penalty = error_penalty
+        self._rtts = dict((h, None) for h in self.hosts)
+        self._errors = dict((h, 0.0) for h in self.hosts)
+        self._lock = threading.Lock()
+
+    def score(self, host):
+        """Score of a host, the lower the better"""
+        return (self._rtts[host] or 0.0) + \
+                self.error_penalty * self._errors[host]
+
+    def select(self):
+        """Select the host with the lowest score"""
+        return min(self.hosts, key=self.score)
+
+    def record(self, host, rtt, error=False):
+        """Record the outcome of a request to a host
+
+        :param str host: The host
+        :param float rtt: Seconds until the response headers arrived,
+                          :class:`None` to only record the outcome
+        :param bool error: Whether the request failed with a connection error
+                           or a server error
+        """
+        a = self.alpha
+        with self._lock:
+            self._errors[host] = (1 - a) * self._errors[host] + \
+                    (a if error else 0.0)
+            if not error and rtt is not None:
+                prev = self._rtts[host]
+                self._rtts[host] = rtt if prev is None else \
+                        (1 - a) * prev + a * rtt
+
+    def probe(self, session, ssl=False, timeout=5):
+        """Measure the round trip time of every host with a ``HEAD`` request
+
+        :param session: :class:`requests.Session` to send the requests with
+        :param bool ssl: Whether to use SSL
+        :param float timeout: Seconds to wait for a host
+        """
+        proto = 'https://' if ssl else 'http://'
+        for host in self.hosts:
+            start = time.time()
+            try:
+                session.head(proto + host + '/', timeout=timeout)
+            except requests.RequestException:
+                self.record(host, None, True)
+            else:
+                self.record(host, time.time() - start)
+
+    def stats(self):
+        """Averaged round trip time and error rate of the hosts
+
+        :rtype: :class:`dict` of ``host: (rtt, error_rate)``
+        """
+        return dict((h, (self._rtts[h], self._errors[h])) for h in self.hosts)
@@ -0,0 +1,172 @@
+from bisect import bisect_left
+import socket
+import threading
+
+
+class RequestEvent(object):
+    """Outcome of an API call, including its retries, passed to the
+    ``metrics`` sinks of :class:`~upyun.UpYun`"""
+    __slots__ = ('op', 'method', 'path', 'host', 'status', 'error', 'retries',
+            'bytes_sent', 'bytes_received', 'connect', 'ttfb', 'elapsed',
+            'total')
+
+    def __init__(self, op, method, path, host, status, error, retries,
+            bytes_sent, bytes_received, connect, ttfb, elapsed, total):
+        #: Name of the operation, like ``put``, ``get`` or ``ls``
+        self.op = op
+
+        #: HTTP method
+        self.method = method
+
+        #: Path on the server
+        self.path = path
+
+        #: API host the last try was sent to
+        self.host = host
+
+        #: Status code of the response, :class:`None` if there was none
+        self.status = status
+
+        #: Exception raised by the last try, if any
+        self.error = error
+
+        #: Number of retries
+        self.retries = retries
+
+        #: Size of the request body, :class:`None` for an iterable
+        self.bytes_sent = bytes_sent
+
+        #: Size of the response body, the ``Content-Length`` of a streamed
+        #: response which is not read yet
+        self.bytes_received = bytes_received
+
+        #: Seconds to resolve the host and connect in the last try,
+        #: :class:`None` if a kept alive connection was reused
+        self.connect = connect
+
+        #: Seconds from sending the last try to its response headers
+        self.ttfb = ttfb
+
+        #: Seconds of the last try
+        self.elapsed = elapsed
+
+        #: Seconds of the call, including the retries
+        self.total = total
+
+    @property
+    def success(self):
+        """Whether the call got a ``2xx`` response"""
+        return self.status is not None and 200 <= self.status < 300
+
+    def __repr__(self):
+        return '<RequestEvent %s %s %s %.3fs>' % (self.op, self.path,
+                self.status or self.error, self.total)
+
+
+class Histogram(object):
+    """Sink aggregating the events by operation in memory, the durations of
+    the calls are counted in buckets
+
+    :param buckets: Upper bounds of the buckets in seconds, in ascending
+                    order, slower calls are counted in an extra bucket
+    """
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._ops = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            stats = self._ops.get(event.op)
+            if stats is None:
+                stats = self._ops[event.op] = {'count': 0, 'errors': 0,
+                        'retries': 0, 'bytes_sent': 0, 'bytes_received': 0,
+                        'time': 0.0, 'counts': [0] * (len(self.buckets) + 1)}
+            stats['count'] += 1
+            stats['errors'] += not event.success
+            stats['retries'] += event.retries
+            stats['bytes_sent'] += event.bytes_sent or 0
+            stats['bytes_received'] += event.bytes_received
+            stats['time'] += event.total
+            stats['counts'][bisect_left(self.buckets, event.total)] += 1
+
+    def percentile(self, op, q):
+        """Upper bound of the bucket holding the ``q`` quantile of the
+        durations of an operation
+
+        :param str op: Name of the operation
+        :param float q: Quantile, from 0 to 1
+        :returns: Seconds, ``float('inf')`` for the extra bucket, or
+                  :class:`None` if the operation was not called
+        """
+        with self._lock:
+            stats = self._ops.get(op)
+            if stats is None:
+                return None
+            rank = q * stats['count']
+            seen = 0
+            for i, count in enumerate(stats['counts']):
+                seen += count
+                if count and seen >= rank:
+                    break
+        return self.buckets[i] if i < len(self.buckets) else float('inf')
+
+    def snapshot(self):
+        """Aggregates of the operations
+
+        :rtype: :class:`dict` of ``op: dict``, with the ``count``,
+                ``errors``, ``retries``, ``bytes_sent``, ``bytes_received``,
+                total ``time`` and bucket ``counts`` of the calls
+        """
+        with self._lock:
+            return dict((op, dict(stats, counts=list(stats['counts'])))
+                    for op, stats in self._ops.iteritems())
+
+    def clear(self):
+        with self._lock:
+            self._ops.clear()
+
+
+class StatsdSink(object):
+    """Sink sending the events as StatsD lines over UDP, metrics are named
+    ``<prefix>.<op>.<metric>``
+
+    :param str host: Host of the StatsD server
+    :param int port: Port of the StatsD server
+    :param str prefix: Prefix of the metrics
+    :param write: Function called with the lines of every event instead of
+                  sending them
+    """
+    def __init__(self, host='127.0.0.1', port=8125, prefix='upyun',
+            write=None):
+        self.prefix = prefix
+        if write is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            address = (host, port)
+            write = lambda data: sock.sendto(data, address)
+        self.write = write
+
+    def lines(self, event):
+        """StatsD lines of an event"""
+        name = '%s.%s' % (self.prefix, event.op)
+        lines = ['%s.requests:1|c' % name,
+                '%s.status.%s:1|c' % (name, event.status or 'error'),
+                '%s.time:%d|ms' % (name, event.total * 1000),
+                '%s.bytes_received:%d|c' % (name, event.bytes_received)]
+        if event.bytes_sent:
+            lines.append('%s.bytes_sent:%d|c' % (name, event.bytes_sent))
+        if event.retries:
+            lines.append('%s.retries:%d|c' % (name, event.retries))
+        if event.ttfb is not None:
+            lines.append('%s.ttfb:%d|ms' % (name, event.ttfb * 1000))
+        if event.connect is not None:
+            lines.append('%s.connect:%d|ms' % (name, event.connect * 1000))
+        return lines
+
+    def __call__(self, event):
+        try:
+            self.write('\n'.join(self.lines(event)))
+        except socket.error:
+            pass
@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+
+import requests
+
+from . import bulk, const, response, stream
+
+
+class ResumableUpload(object):
+    """Upload a large local file in parts, the parts are uploaded concurrently
+    and recorded in a local state file as they are acknowledged, so an
+    interrupted upload resumes from the parts left, the upload is completed
+    once all the parts are acknowledged
+
+    Every part is sent with its ``Content-MD5``, so the server verifies it
+    and a failed part is retried by the :class:`~retry.RetryPolicy` of the
+    client. The completion is sent with the md5 of the whole file, looked up
+    in the :class:`~stream.DigestCache` of the client if any, so the server
+    verifies the assembled file.
+
+    :param client: :class:`~upyun.UpYun` client to upload with
+    :param str path: File path on the server
+    :param str filename: Path of the local file
+    :param int part_size: Size of the parts, a multiple of
+                          :const:`~const.MULTIPART_UNIT`
+    :param int workers: Number of parts uploaded concurrently
+    :param str state_path: Path of the state file, default ``filename``
+                           followed by ``.upyun``
+    :param str mimetype: Mime-type of the file
+    """
+    def __init__(self, client, path, filename,
+            part_size=const.DEFAULT_PART_SIZE, workers=const.DEFAULT_WORKERS,
+            state_path=None, mimetype=None):
+        if part_size <= 0 or part_size % const.MULTIPART_UNIT:
+            raise Exception('put: part size must be a multiple of %d' %
+                    const.MULTIPART_UNIT)
+        self.client = client
+        self.path = path
+        self.filename = filename
+        self.part_size = part_size
+        self.workers = workers
+        self.state_path = state_path or (filename + '.upyun')
+        self.mimetype = mimetype
+        self.size = os.path.getsize(filename)
+
+        #: State of the upload, persisted in the state file
+        self.state = None
+
+        self._lock = threading.Lock()
+
+    @property
+    def parts(self):
+        """Number of parts of the file"""
+        return max((self.size + self.part_size - 1) // self.part_size, 1)
+
+    def _load_state(self):
+        st = os.stat(self.filename)
+        fresh = {'path': self.path, 'size': st.st_size,
+                'mtime': st.st_mtime, 'part_size': self.part_size,
+                'uuid': None, 'done': []}
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (IOError, ValueError):
+            return fresh
+        for k in ('path', 'size', 'mtime', 'part_size'):
+            if state.get(k) != fresh[k]:
+                return fresh
+        return state
+
+    def _save_state(self):
+        tmp = self.state_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f)
+        os.rename(tmp, self.state_path)
+
+    def _send(self, headers, data=None):
+        return self.client._request('PUT', self.path,
+                response.MultipartResponse,
+                self.client._get_file_url(self.path), data=data,
+                headers=headers, op='multipart')
+
+    def _initiate(self):
+        headers = {
+                const.HEADER_MULTI_STAGE: const.MULTI_STAGE_INITIATE,
+                const.HEADER_MULTI_LENGTH: str(self.size),
+                const.HEADER_MULTI_TYPE:
+                    self.mimetype or 'application/octet-stream',
+                const.HEADER_MULTI_DISORDER: 'true',
+                }
+        return self._send(headers)
+
+    def _upload_part(self, part_id):
+        offset = part_id * self.part_size
+        length = min(self.part_size, self.size - offset)
+        headers = {
+                const.HEADER_MULTI_STAGE: const.MULTI_STAGE_UPLOAD,
+                const.HEADER_MULTI_UUID: self.state['uuid'],
+                const.HEADER_PART_ID: str(part_id),
+                }
+        with open(self.filename, 'rb') as f:
+            f.seek(offset)
+            headers[const.HEADER_MD5] = stream.md5_file(f, length,
+                    self.client.chunk_size)
+            data = stream.StreamBody(f, length, self.client.chunk_size) \
+                    if length else ''
+            resp = self._send(headers, data)
+        if resp.success:
+            with self._lock:
+                self.state['done'].append(part_id)
+                self._save_state()
+        return resp
+
+    def _file_md5(self):
+        chunk_size = self.client.chunk_size
+        with open(self.filename, 'rb') as f:
+            if self.client.digest_cache is not None:
+                return self.client.digest_cache.digest(f, chunk_size)
+            return stream.md5_file(f, self.size, chunk_size)
+
+    def _complete(self):
+        headers = {
+                const.HEADER_MULTI_STAGE: const.MULTI_STAGE_COMPLETE,
+                const.HEADER_MULTI_UUID: self.state['uuid'],
+                const.HEADER_MULTI_MD5: self._file_md5(),
+                }
+        return self._send(headers)
+
+    def _expired(self, resp):
+        # the server does not know the upload, it was dropped or expired
+        return not isinstance(resp, Exception) and \
+                resp.response.status_code == requests.codes.not_found
+
+    def run(self):
+        """Upload the parts left and complete the upload, the state file is
+        removed when the upload is completed
+
+        An upload the server no longer knows, answering a part or the
+        completion with a 404, is started over once with a new upload.
+
+        :returns: Response of completing the upload, or of the first part or
+                  stage failed
+        :rtype: :class:`~response.MultipartResponse`
+        """
+        self.state = self._load_state()
+        resp = self._run()
+        if self.state['uuid'] and self._expired(resp):
+            self.state['uuid'] = None
+            self.state['done'] = []
+            self._save_state()
+            resp = self._run()
+        return resp
+
+    def _run(self):
+        if not self.state['uuid']:
+            resp = self._initiate()
+            if not resp.success:
+                return resp
+            self.state['uuid'] = resp.uuid
+            self.state['done'] = []
+            self._save_state()
+
+        done = set(self.state['done'])
+        left = [i for i in xrange(self.parts) if i not in done]
+        self.client._ensure_pool_size(self.workers)
+        failed = None
+        for _, resp in bulk.Bulk(self._upload_part, left, self.workers):
+            if failed is None and (isinstance(resp, Exception) or
+                    not resp.success):
+                failed = resp
+        if isinstance(failed, Exception):
+            raise failed
+        if failed is not None:
+            return failed
+
+        resp = self._complete()
+        if resp.success:
+            os.remove(self.state_path)
+        return resp
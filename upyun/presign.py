@@ -0,0 +1,139 @@
+import base64
+import hashlib
+import json
+import time
+from urllib import pathname2url
+
+from . import const
+
+
+class Presigner(object):
+    """Sign uploads and downloads for clients talking to UpYun directly, so
+    browsers and mobile apps upload and download without going through the
+    application servers
+
+    An upload is signed as a form API policy, a base64 JSON document naming
+    the bucket, the ``save-key`` the file is stored at and the expiration,
+    signed with the form API secret of the bucket. A download is signed as a
+    URL carrying a ``_upt`` token, checked against the token secret of the
+    anti-leech settings of the bucket. Signing needs no request to UpYun.
+
+    Usage::
+
+        signer = client.presigner(form_api_secret='secret')
+        fields = signer.upload('/avatars/1.png', expires=300,
+                content_length_range='0,1048576')
+        # POST fields['policy'], fields['signature'] and the file to
+        # fields['action'] as multipart/form-data
+
+    :param str bucket: Bucket
+    :param str form_api_secret: Form API secret of the bucket, needed to sign
+                                uploads
+    :param str token_secret: Token secret of the bucket, needed to sign
+                             downloads
+    :param api_host: API host the forms are posted to, see
+                     :ref:`API Hosts <api-hosts>`
+    :param str domain: Domain of the download URLs, default the domain of the
+                       bucket
+    :param bool ssl: Whether the URLs use SSL
+    """
+    def __init__(self, bucket, form_api_secret=None, token_secret=None,
+            api_host=const.API_HOST_AUTO, domain=None, ssl=False):
+        self.bucket = bucket
+        self.form_api_secret = form_api_secret
+        self.token_secret = token_secret
+        proto = 'https://' if ssl else 'http://'
+        self._action = proto + const.UPAIYUN_API_HOSTS[api_host] + '/' + \
+                bucket
+        self._download_base_url = proto + (domain or
+                const.BUCKET_DOMAIN % bucket)
+
+    def _expiration(self, expires, now):
+        return int((time.time() if now is None else now) + expires)
+
+    def _policy_prefix(self, expiration, options):
+        # the JSON of everything but the save-key, shared by a batch
+        policy = {'bucket': self.bucket, 'expiration': expiration}
+        for name, value in options.iteritems():
+            policy[name.replace('_', '-')] = value
+        return json.dumps(policy, sort_keys=True)[:-1] + ', "save-key": '
+
+    def uploads(self, paths, expires=const.DEFAULT_PRESIGN_EXPIRES,
+            now=None, **options):
+        """Sign the form uploads of many files, with one expiration
+
+        :param paths: Iterable of paths the files are stored at
+        :param int expires: Seconds the policies are valid for
+        :param float now: Time the expiration is counted from, default the
+                          current time
+        :param options: Other policy parameters, the underscores of the names
+                        are sent as dashes, like ``content_length_range``,
+                        ``allow_file_type``, ``return_url`` or ``notify_url``
+        :returns: Iterator of the form fields of every path, see
+                  :meth:`upload`
+        """
+        if not self.form_api_secret:
+            raise Exception('uploads: form_api_secret is required')
+        prefix = self._policy_prefix(self._expiration(expires, now), options)
+        return self._iter_uploads(paths, prefix)
+
+    def _iter_uploads(self, paths, prefix):
+        suffix = '&' + self.form_api_secret
+        for path in paths:
+            policy = base64.b64encode(prefix +
+                    json.dumps('/' + path.lstrip('/')) + '}')
+            yield {
+                    'action': self._action,
+                    'policy': policy,
+                    'signature': hashlib.md5(policy + suffix).hexdigest(),
+                    }
+
+    def upload(self, path, expires=const.DEFAULT_PRESIGN_EXPIRES, now=None,
+            **options):
+        """Sign the form upload of a file
+
+        :param str path: Path the file is stored at
+        :param int expires: Seconds the policy is valid for
+        :param float now: Time the expiration is counted from, default the
+                          current time
+        :param options: Other policy parameters, see :meth:`uploads`
+        :returns: ``action``, the URL the form is posted to, with the
+                  ``policy`` and ``signature`` fields to post along the
+                  ``file``
+        :rtype: :class:`dict`
+        """
+        return next(self.uploads([path], expires, now, **options))
+
+    def downloads(self, paths, expires=const.DEFAULT_PRESIGN_EXPIRES,
+            now=None):
+        """Sign the download URLs of many files, with one expiration
+
+        :param paths: Iterable of file paths
+        :param int expires: Seconds the URLs are valid for
+        :param float now: Time the expiration is counted from, default the
+                          current time
+        :returns: Iterator of the URLs
+        """
+        if not self.token_secret:
+            raise Exception('downloads: token_secret is required')
+        return self._iter_downloads(paths,
+                str(self._expiration(expires, now)))
+
+    def _iter_downloads(self, paths, expiration):
+        prefix = self.token_secret + '&' + expiration + '&'
+        for path in paths:
+            uri = pathname2url('/' + path.lstrip('/'))
+            token = hashlib.md5(prefix + uri).hexdigest()[12:20] + expiration
+            yield self._download_base_url + uri + '?_upt=' + token
+
+    def download(self, path, expires=const.DEFAULT_PRESIGN_EXPIRES,
+            now=None):
+        """Sign the download URL of a file
+
+        :param str path: File path
+        :param int expires: Seconds the URL is valid for
+        :param float now: Time the expiration is counted from, default the
+                          current time
+        :rtype: :class:`str`
+        """
+        return next(self.downloads([path], expires, now))
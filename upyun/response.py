@@ -1,4 +1,5 @@
-from collections import namedtuple
+from array import array
+from cStringIO import StringIO
 from datetime import datetime
 import os.path
 import urllib
@@ -8,6 +9,10 @@ import requests
 
 from upyun import const
 
+# Python 2 has no typecode for long long, the double fallback is exact up
+# to 2 ** 53
+_INT64_TYPECODE = 'l' if array('l').itemsize == 8 else 'd'
+
 
 class ResponseBase(object):
     """A response of successfully uploading image, contains extra info
@@ -24,6 +29,17 @@ class ResponseBase(object):
         #: URL of the file on the UpYun
         self.url = url
 
+        #: Number of times the request was retried
+        self.retries = 0
+
+        #: Whether the request failed for good because its deadline passed
+        #: before it could be retried
+        self.deadline_exceeded = False
+
+        #: Whether the response was served from a
+        #: :class:`~upyun.cache.ContentCache`
+        self.from_cache = False
+
         #: Error of the request, a :class:`tuple` in the form of
         #: ``(<status code>, <error message>)``
         self.error = self._populate_error()
@@ -38,7 +54,8 @@ class ResponseBase(object):
     @property
     def success(self):
         """Whether the API request is successful"""
-        return self.response.status_code == requests.codes.ok
+        return requests.codes.ok <= self.response.status_code < \
+                requests.codes.multiple_choices
 
 
 class ImageInfoMixin(object):
@@ -126,41 +143,331 @@ class GetMixin(object):
         """Data of the downloaded file"""
         return self.response.content
 
+    def iter_content(self, chunk_size=const.DEFAULT_CHUNK_SIZE):
+        """Iterate over the data of the downloaded file in chunks, with a
+        streamed request the data is read from the network as it is iterated
+
+        :param int chunk_size: Size of the chunks
+        """
+        return self.response.iter_content(chunk_size)
+
+    def close(self):
+        """Release the connection of a streamed request which is not
+        entirely consumed"""
+        self.response.close()
+
+
+class MultipartMixin(object):
+    @property
+    def uuid(self):
+        """Upload id of a resumable upload
+
+        :rtype: :class:`str` or :class:`None`
+        """
+        return self._get_header_with_prefix('multi-uuid')
+
+    @property
+    def next_part_id(self):
+        """Id of the next part the server expects
+
+        :rtype: :class:`int` or :class:`None`
+        """
+        n = self._get_header_with_prefix('next-part-id')
+        return int(n) if n else None
+
+
+class FileInfo(object):
+    """Info of a file or a folder in a listing, it behaves like a namedtuple
+    of ``(name, path, url, type, size, mtime)``, while ``path``, ``url`` and
+    ``mtime`` of an entry parsed from a listing are computed when accessed
+
+    It supports iterating, indexing, comparing with tuples, :meth:`_asdict`,
+    :meth:`_replace`, :meth:`_make` and pickling, but unlike the namedtuple
+    it replaced it is not a :class:`tuple` subclass, ``isinstance(f,
+    tuple)`` is false and ``tuple(f)`` converts it.
+    """
+    __slots__ = ('name', 'type', 'size', '_path', '_url', '_mtime',
+            '_raw_mtime', '_folder_path', '_base_url')
+
+    _fields = ('name', 'path', 'url', 'type', 'size', 'mtime')
+
+    def __init__(self, name, path, url, type, size, mtime):
+        self.name = name
+        self.type = type
+        self.size = size
+        self._path = path
+        self._url = url
+        self._mtime = mtime
+        self._raw_mtime = self._folder_path = self._base_url = None
+
+    @classmethod
+    def _from_listing(cls, name, type, size, raw_mtime, folder_path,
+            base_url):
+        f = cls.__new__(cls)
+        f.name = name
+        f.type = type
+        f.size = size
+        f._path = f._url = f._mtime = None
+        f._raw_mtime = raw_mtime
+        f._folder_path = folder_path
+        f._base_url = base_url
+        return f
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = os.path.join(self._folder_path, self.name)
+        return self._path
+
+    @property
+    def url(self):
+        if self._url is None and self._base_url is not None:
+            self._url = urlparse.urljoin(self._base_url, self.path)
+        return self._url
+
+    @property
+    def mtime(self):
+        if self._mtime is None and self._raw_mtime is not None:
+            self._mtime = datetime.utcfromtimestamp(float(self._raw_mtime))
+        return self._mtime
+
+    @classmethod
+    def _make(cls, iterable):
+        return cls(*iterable)
+
+    def _asdict(self):
+        return dict(zip(self._fields, self))
+
+    def _replace(self, **kwargs):
+        values = self._asdict()
+        values.update(kwargs)
+        return self.__class__(**values)
+
+    def __reduce__(self):
+        return (self.__class__, tuple(self))
+
+    def __iter__(self):
+        return (getattr(self, f) for f in self._fields)
+
+    def __getitem__(self, i):
+        return tuple(self)[i]
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __eq__(self, other):
+        if isinstance(other, (FileInfo, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return 'FileInfo(%s)' % ', '.join('%s=%r' % (f, getattr(self, f))
+                for f in self._fields)
+
+
+class CompactListing(object):
+    """A listing stored in columns: the utf-8 encoded names in one string
+    buffer, sizes and mtimes in :class:`array.array`, and types in a
+    :class:`bytearray`, :class:`~upyun.response.LsMixin.FileInfo` of an
+    entry is only created when the entry is accessed
+
+    :param str folder_path: Path of the listed folder
+    :param str base_url: Scheme and host of the file URLs
+    """
+    def __init__(self, folder_path, base_url):
+        self.folder_path = folder_path
+        self.base_url = base_url
+
+        #: Sizes of the entries
+        self.sizes = array(_INT64_TYPECODE)
+
+        #: Modified times of the entries, in seconds since the epoch
+        self.mtimes = array(_INT64_TYPECODE)
+
+        #: Types of the entries, :const:`~upyun.const.FILE_TYPE_FILE` or
+        #: :const:`~upyun.const.FILE_TYPE_FOLDER`
+        self.types = bytearray()
+
+        self._ends = array(_INT64_TYPECODE)
+        self._buf = StringIO()
+        self._table = None
+
+    def _append(self, name, type, size, mtime):
+        self._buf.write(name)
+        self._ends.append(self._buf.tell())
+        self.types.append(type)
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+
+    def _finish(self):
+        self._buf = self._buf.getvalue()
+
+    def __len__(self):
+        return len(self.types)
+
+    def _raw_name(self, i):
+        start = int(self._ends[i - 1]) if i else 0
+        return self._buf[start:int(self._ends[i])]
+
+    def name(self, i):
+        """Name of the ``i``-th entry"""
+        return unicode(self._raw_name(i), 'utf-8')
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('listing index out of range')
+        return FileInfo._from_listing(self.name(i), self.types[i],
+                int(self.sizes[i]), int(self.mtimes[i]), self.folder_path,
+                self.base_url)
+
+    def __iter__(self):
+        return (self[i] for i in xrange(len(self)))
+
+    def iter_files(self):
+        """Iterate over the files
+
+        :rtype: iterator of :class:`~upyun.response.LsMixin.FileInfo`
+        """
+        return (self[i] for i in xrange(len(self))
+                if self.types[i] == const.FILE_TYPE_FILE)
+
+    def iter_folders(self):
+        """Iterate over the folders
+
+        :rtype: iterator of :class:`~upyun.response.LsMixin.FileInfo`
+        """
+        return (self[i] for i in xrange(len(self))
+                if self.types[i] == const.FILE_TYPE_FOLDER)
+
+    def _build_table(self):
+        size = 1
+        while size < len(self) * 2:
+            size <<= 1
+        mask = size - 1
+        table = array(_INT64_TYPECODE, [0]) * size
+        for i in xrange(len(self)):
+            slot = hash(self._raw_name(i)) & mask
+            while table[slot]:
+                slot = (slot + 1) & mask
+            table[slot] = i + 1
+        self._table = table
+
+    def index(self, name):
+        """Index of the entry with the name, the index is backed by a compact
+        hash table built on the first lookup
+
+        :rtype: :class:`int` or :class:`None`
+        """
+        if self._table is None:
+            self._build_table()
+        if isinstance(name, unicode):
+            name = name.encode('utf-8')
+        table = self._table
+        mask = len(table) - 1
+        slot = hash(name) & mask
+        while table[slot]:
+            i = int(table[slot]) - 1
+            if self._raw_name(i) == name:
+                return i
+            slot = (slot + 1) & mask
+        return None
+
+    def get(self, name, default=None):
+        """Get the entry with the name
+
+        :rtype: :class:`~upyun.response.LsMixin.FileInfo`
+        """
+        i = self.index(name)
+        return default if i is None else self[i]
+
+    def __contains__(self, name):
+        return self.index(name) is not None
+
 
 class LsMixin(object):
     TYPE_FILE_STR = 'N'
     TYPE_FOLDER_STR = 'F'
 
-    FileInfo = namedtuple('FileInfo',
-            ['name', 'path', 'url', 'type', 'size', 'mtime'])
+    FileInfo = FileInfo
 
-    def _parse_response(self):
-        self._files = {}
-        self._folders = {}
+    def _listing_base(self):
+        url_parsed = urlparse.urlparse(self.url)
+        return url_parsed.path, url_parsed.scheme + '://' + url_parsed.netloc
 
-        for l in self.response.content.strip().split("\n"):
+    def _iter_rows(self):
+        if not self.success:
+            return
+        types = {
+                self.TYPE_FILE_STR: const.FILE_TYPE_FILE,
+                self.TYPE_FOLDER_STR: const.FILE_TYPE_FOLDER,
+                }
+        for l in StringIO(self.response.content):
             l = l.strip()
             if l:
                 name, type, size, mtime = l.split("\t")
+                type = types.get(type.upper())
+                if type is not None:
+                    yield name, type, size, mtime
+
+    def iter_entries(self):
+        """Iterate over the files and folders in the directory, the entries
+        are parsed as they are iterated
 
-                name = unicode(name, 'utf-8')
-                type = type.upper()
-                url_parsed = urlparse.urlparse(self.url)
-                folder_path = url_parsed.path
+        :rtype: iterator of :class:`~upyun.response.LsMixin.FileInfo`
+        """
+        folder_path, base_url = self._listing_base()
+        from_listing = self.FileInfo._from_listing
+        for name, type, size, mtime in self._iter_rows():
+            yield from_listing(unicode(name, 'utf-8'), type, int(size), mtime,
+                    folder_path, base_url)
 
-                path = os.path.join(folder_path, name)
-                url = urlparse.urljoin(
-                        (url_parsed.scheme + '://' + url_parsed.netloc), path)
-                mtime = datetime.utcfromtimestamp(float(mtime))
+    def compact(self):
+        """Parse the listing into a :class:`CompactListing`, which takes a
+        fraction of the memory of :attr:`files` and :attr:`folders`
+
+        :rtype: :class:`CompactListing`
+        """
+        listing = CompactListing(*self._listing_base())
+        append = listing._append
+        for name, type, size, mtime in self._iter_rows():
+            append(name, type, int(size), int(float(mtime)))
+        listing._finish()
+        return listing
+
+    def iter_files(self):
+        """Iterate over the files in the directory
+
+        :rtype: iterator of :class:`~upyun.response.LsMixin.FileInfo`
+        """
+        return (f for f in self.iter_entries()
+                if f.type == const.FILE_TYPE_FILE)
 
-                if type == self.TYPE_FILE_STR:
-                    f = self.FileInfo(name=name, path=path, url=url,
-                            type=const.FILE_TYPE_FILE, size=int(size), mtime=mtime)
-                    self._files[name] = f
-                elif type == self.TYPE_FOLDER_STR:
-                    f = self.FileInfo(name=name, path=path, url=url,
-                            type=const.FILE_TYPE_FOLDER, size=int(size), mtime=mtime)
-                    self._folders[name] = f
+    def iter_folders(self):
+        """Iterate over the folders in the directory
+
+        :rtype: iterator of :class:`~upyun.response.LsMixin.FileInfo`
+        """
+        return (f for f in self.iter_entries()
+                if f.type == const.FILE_TYPE_FOLDER)
+
+    def _parse_response(self):
+        self._files = {}
+        self._folders = {}
+
+        for f in self.iter_entries():
+            if f.type == const.FILE_TYPE_FILE:
+                self._files[f.name] = f
+            else:
+                self._folders[f.name] = f
 
     @property
     def files(self):
@@ -223,5 +530,9 @@ class LsResponse(ResponseBase, LsMixin):
     pass
 
 
+class MultipartResponse(ResponseBase, MultipartMixin):
+    pass
+
+
 class Response(ResponseBase):
     pass
@@ -0,0 +1,130 @@
+import random
+import threading
+
+import requests
+
+from . import const
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """The deadline of a request passed before it succeeded, raised instead of
+    the error of its last try"""
+
+
+class RetryBudget(object):
+    """Limit retries to a share of the requests, so retries do not multiply
+    the load on a server which is already failing
+
+    Every request adds ``ratio`` to the balance, every retry takes one off,
+    the balance is capped at ``reserve``.
+
+    :param float ratio: Retries earned per request
+    :param int reserve: Max retries allowed in a burst
+    """
+    def __init__(self, ratio=0.2, reserve=10):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._balance = float(reserve)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._balance = min(self._balance + self.ratio, self.reserve)
+
+    def withdraw(self):
+        """Take a retry off the budget
+
+        :returns: Whether the budget allows the retry
+        """
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+
+class RetryPolicy(object):
+    """Policy deciding whether and when a failed request is retried, only
+    idempotent requests are retried: ``GET``, ``HEAD``, ``DELETE`` and
+    ``PUT`` with a ``Content-MD5`` header
+
+    The delay before the n-th retry is ``backoff * 2 ** (n - 1)``, capped at
+    ``max_backoff``, of which a random share up to ``jitter`` is taken off.
+
+    :param int total: Max retries of a request
+    :param statuses: Status codes to retry
+    :param float backoff: Delay before the first retry in seconds
+    :param float max_backoff: Max delay between retries in seconds
+    :param float jitter: Share of the delay randomized, from 0 to 1
+    :param bool connection_errors: Whether to retry connection errors
+    :param bool timeouts: Whether to retry timeouts
+    :param budget: :class:`RetryBudget` shared by the requests, ``None`` for
+                   no budget
+    """
+    IDEMPOTENT_METHODS = ('GET', 'HEAD', 'DELETE', 'OPTIONS')
+
+    def __init__(self, total=3, statuses=const.RETRY_STATUSES, backoff=0.1,
+            max_backoff=5.0, jitter=0.5, connection_errors=True,
+            timeouts=True, budget=None):
+        self.total = total
+        self.statuses = frozenset(statuses)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.connection_errors = connection_errors
+        self.timeouts = timeouts
+        self.budget = budget
+
+        #: Number of retries done under the policy
+        self.retries = 0
+
+        self._lock = threading.Lock()
+
+    def is_idempotent(self, method, headers=None):
+        """Whether a request can be safely sent more than once"""
+        if method in self.IDEMPOTENT_METHODS:
+            return True
+        return method == 'PUT' and bool(headers) and \
+                const.HEADER_MD5 in headers
+
+    def is_retryable(self, resp=None, error=None):
+        """Whether the outcome of a request is a transient failure
+
+        :param resp: :class:`requests.Response` of the request
+        :param error: Exception raised by the request
+        """
+        if error is not None:
+            if isinstance(error, requests.exceptions.Timeout):
+                return self.timeouts
+            if isinstance(error, requests.exceptions.ConnectionError):
+                return self.connection_errors
+            return False
+        return resp is not None and resp.status_code in self.statuses
+
+    def can_retry(self, method, headers, attempt, resp=None, error=None):
+        """Whether a request may be retried after its ``attempt``-th try
+        failed, regardless of the budget, nothing is counted"""
+        return attempt <= self.total and \
+                self.is_idempotent(method, headers) and \
+                self.is_retryable(resp, error)
+
+    def should_retry(self, method, headers, attempt, resp=None, error=None):
+        """Whether to retry a request after its ``attempt``-th try failed,
+        the retry is taken off the budget if allowed"""
+        if not self.can_retry(method, headers, attempt, resp, error):
+            return False
+        if self.budget is not None and not self.budget.withdraw():
+            return False
+        with self._lock:
+            self.retries += 1
+        return True
+
+    def delay(self, attempt):
+        """Delay in seconds before the ``attempt``-th retry"""
+        delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        return delay * (1 - self.jitter * random.random())
+
+    def record(self):
+        """Record a new request, earning retries for the budget"""
+        if self.budget is not None:
+            self.budget.deposit()
@@ -0,0 +1,108 @@
+import os
+
+import requests
+
+from . import bulk, const
+
+
+class SegmentedDownload(object):
+    """Download a large file in byte ranges fetched concurrently, each range
+    is streamed into its offset of a temporary file preallocated to the
+    :attr:`~response.InfoResponse.size` of the file, which is renamed to the
+    local file once every range is written in full
+
+    A range whose length or whose ``Content-Range`` total does not match the
+    size fails the download, so a file changed during the download is not
+    stitched together.
+
+    :param client: :class:`~upyun.UpYun` client to download with
+    :param str path: File path on the server
+    :param str filename: Path of the local file
+    :param int segments: Max number of ranges
+    :param int min_segment_size: Ranges are not split smaller than it
+    :param int workers: Number of ranges fetched concurrently, default the
+                        number of ranges
+    """
+    def __init__(self, client, path, filename,
+            segments=const.DEFAULT_SEGMENTS,
+            min_segment_size=const.MIN_SEGMENT_SIZE, workers=None):
+        self.client = client
+        self.path = path
+        self.filename = filename
+        self.segments = segments
+        self.min_segment_size = min_segment_size
+        self.workers = workers
+        self.tmp = filename + '.part'
+
+        #: Size of the file on the server, known after :meth:`run`
+        self.size = None
+
+    def ranges(self, size):
+        """Split a file of ``size`` bytes into ``(start, end)`` ranges, the
+        end is inclusive"""
+        if not size:
+            return []
+        n = max(min(self.segments, size // self.min_segment_size), 1)
+        step = (size + n - 1) // n
+        return [(start, min(start + step, size) - 1)
+                for start in xrange(0, size, step)]
+
+    def _download_range(self, rng):
+        start, end = rng
+        resp = self.client.get(self.path, stream=True, range=rng)
+        if not resp.success:
+            return resp
+        try:
+            if resp.response.status_code != requests.codes.partial_content \
+                    and rng != (0, self.size - 1):
+                raise Exception('get: range %d-%d not served' % rng)
+            total = resp.response.headers.get('Content-Range',
+                    '').rpartition('/')[2]
+            if total.isdigit() and int(total) != self.size:
+                raise Exception('get: size changed to %s during the download'
+                        % total)
+            written = 0
+            with open(self.tmp, 'r+b') as f:
+                f.seek(start)
+                for chunk in resp.iter_content(self.client.chunk_size):
+                    f.write(chunk)
+                    written += len(chunk)
+        finally:
+            resp.close()
+        if written != end - start + 1:
+            raise Exception('get: range %d-%d got %d bytes' %
+                    (start, end, written))
+        return resp
+
+    def run(self):
+        """Download the ranges and move the file in place
+
+        :returns: :class:`~response.InfoResponse` of the file, or the response
+                  of the first request failed
+        """
+        info = self.client.info(self.path)
+        if not info.success:
+            return info
+        self.size = info.size
+        with open(self.tmp, 'wb') as f:
+            f.truncate(self.size)
+        ranges = self.ranges(self.size)
+        workers = self.workers or len(ranges) or 1
+        self.client._ensure_pool_size(workers)
+        failed = None
+        try:
+            for _, resp in bulk.Bulk(self._download_range, ranges, workers):
+                if failed is None and (isinstance(resp, Exception) or
+                        not resp.success):
+                    failed = resp
+            if isinstance(failed, Exception):
+                raise failed
+            if failed is not None:
+                return failed
+            if os.name == 'nt' and os.path.exists(self.filename):
+                os.remove(self.filename)
+            os.rename(self.tmp, self.filename)
+        finally:
+            if os.path.exists(self.tmp):
+                os.remove(self.tmp)
+        return info
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import stat
+import threading
+
+from . import const
+
+
+def get_size(fileo):
+    """Get the number of bytes left to read in a file like object
+
+    :param fileo: String, file like object or iterable
+    :rtype: :class:`int` or :class:`None` if the size is unknown
+    """
+    if isinstance(fileo, basestring):
+        return len(fileo)
+    try:
+        pos = fileo.tell()
+    except (AttributeError, IOError, OSError):
+        return None
+    try:
+        st = os.fstat(fileo.fileno())
+        if stat.S_ISREG(st.st_mode):
+            return max(st.st_size - pos, 0)
+    except (AttributeError, IOError, OSError, ValueError):
+        pass
+    try:
+        fileo.seek(0, os.SEEK_END)
+        end = fileo.tell()
+        fileo.seek(pos)
+    except (AttributeError, IOError, OSError):
+        return None
+    return max(end - pos, 0)
+
+
+def iter_chunks(fileo, chunk_size=const.DEFAULT_CHUNK_SIZE):
+    """Iterate over a file like object or an iterable in chunks
+
+    Empty chunks are skipped, since an empty chunk would end a chunked
+    transfer.
+
+    :param fileo: File like object or iterable of strings
+    :param int chunk_size: Size of the chunks read from a file like object
+    """
+    if hasattr(fileo, 'read'):
+        while True:
+            chunk = fileo.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        for chunk in fileo:
+            if chunk:
+                yield chunk
+
+
+def md5_file(fileo, length=None, chunk_size=const.DEFAULT_CHUNK_SIZE):
+    """Compute the md5 hex digest of a seekable file like object by reading
+    it in chunks, the file position is restored afterwards
+
+    :param fileo: Seekable file like object
+    :param length: Bytes to hash from the current position, ``None`` for
+                   all the rest
+    :param int chunk_size: Size of the chunks to read
+    :rtype: :class:`str`
+    """
+    md5 = hashlib.md5()
+    pos = fileo.tell()
+    left = length
+    while left is None or left > 0:
+        size = chunk_size if left is None else min(chunk_size, left)
+        chunk = fileo.read(size)
+        if not chunk:
+            break
+        md5.update(chunk)
+        if left is not None:
+            left -= len(chunk)
+    fileo.seek(pos)
+    return md5.hexdigest()
+
+
+class DigestCache(object):
+    """Cache of md5 digests of local files keyed by ``(device, inode, size,
+    mtime)``, so unchanged files are not hashed again when re-uploaded
+
+    :param path: Optional sidecar file to persist the digests in, new digests
+                 are appended to it as they are computed
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self._digests = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    dev, ino, size, mtime, digest = json.loads(line)
+                except ValueError:
+                    continue
+                self._digests[(dev, ino, size, mtime)] = digest
+
+    def _key(self, fileo):
+        try:
+            st = os.fstat(fileo.fileno())
+        except (AttributeError, IOError, OSError, ValueError):
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return (st.st_dev, st.st_ino, st.st_size, st.st_mtime)
+
+    def get(self, fileo):
+        """Get the cached digest of a file
+
+        :rtype: :class:`str` or :class:`None`
+        """
+        key = self._key(fileo)
+        return self._digests.get(key) if key else None
+
+    def digest(self, fileo, chunk_size=const.DEFAULT_CHUNK_SIZE):
+        """Get the md5 hex digest of the whole file, computing and caching it
+        if the file is not cached or has been changed
+
+        :param fileo: Seekable file object
+        :param int chunk_size: Size of the chunks to read
+        :rtype: :class:`str`
+        """
+        key = self._key(fileo)
+        if key is None:
+            return md5_file(fileo, chunk_size=chunk_size)
+        digest = self._digests.get(key)
+        if digest is None:
+            pos = fileo.tell()
+            fileo.seek(0)
+            try:
+                digest = md5_file(fileo, chunk_size=chunk_size)
+            finally:
+                fileo.seek(pos)
+            with self._lock:
+                self._digests[key] = digest
+                if self.path:
+                    with open(self.path, 'a') as f:
+                        f.write(json.dumps(list(key) + [digest]) + '\n')
+        return digest
+
+
+class StreamBody(object):
+    """A file like wrapper with a known length, used as a streamed request
+    body so the data is sent in chunks instead of being loaded into memory
+
+    :param fileo: File like object to read from
+    :param int length: Number of bytes to send from the current position
+    :param int chunk_size: Size of the chunks yielded when iterated
+    """
+    def __init__(self, fileo, length, chunk_size=const.DEFAULT_CHUNK_SIZE):
+        self.fileo = fileo
+        self.length = length
+        self.chunk_size = chunk_size
+        self._start = fileo.tell()
+        self._left = length
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if self._left <= 0:
+            return ''
+        if size is None or size < 0 or size > self._left:
+            size = self._left
+        data = self.fileo.read(size)
+        self._left -= len(data)
+        return data
+
+    def rewind(self):
+        """Seek back to the start of the body, so it can be sent again"""
+        self.fileo.seek(self._start)
+        self._left = self.length
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                break
+            yield chunk
@@ -0,0 +1,345 @@
+import calendar
+import errno
+import os
+import posixpath
+import sqlite3
+import tempfile
+import threading
+import time
+
+from . import bulk, const, stream
+
+
+class Manifest(object):
+    """Local sqlite record of the files uploaded by :func:`sync`, keyed by
+    the path on the server, a file whose size and mtime match its record is
+    known to be unchanged without hashing it or listing the server
+
+    :param str path: Path of the sqlite database
+    """
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.text_factory = str
+        self._conn.execute('CREATE TABLE IF NOT EXISTS files ('
+                'path TEXT PRIMARY KEY, size INTEGER, mtime REAL, md5 TEXT, '
+                'uploaded REAL)')
+
+    def get(self, path):
+        """Get the record of a file
+
+        :returns: ``(size, mtime, md5, uploaded)`` or :class:`None`
+        """
+        return self._conn.execute('SELECT size, mtime, md5, uploaded '
+                'FROM files WHERE path = ?', (path,)).fetchone()
+
+    def paths(self, folder):
+        """List the recorded paths under a folder"""
+        prefix = folder.rstrip('/') + '/'
+        # '0' is the character after '/', so this selects the prefix range
+        cursor = self._conn.execute('SELECT path FROM files '
+                'WHERE path >= ? AND path < ?', (prefix, prefix[:-1] + '0'))
+        return [row[0] for row in cursor]
+
+    def record(self, path, size, mtime, md5, uploaded=None):
+        """Record an uploaded file"""
+        self._conn.execute('INSERT OR REPLACE INTO files '
+                'VALUES (?, ?, ?, ?, ?)',
+                (path, size, mtime, md5, uploaded or time.time()))
+
+    def remove(self, path):
+        """Remove the record of a file"""
+        self._conn.execute('DELETE FROM files WHERE path = ?', (path,))
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+
+class SyncPlan(object):
+    """Changes to make the server mirror a local folder, made by
+    :func:`sync`
+
+    :param client: :class:`~upyun.UpYun` client
+    :param manifest: :class:`Manifest` of the synced files
+    """
+    def __init__(self, client, manifest):
+        self.client = client
+        self.manifest = manifest
+
+        #: ``(local path, remote path)`` of the new or changed files
+        self.uploads = []
+
+        #: Remote paths of the files deleted locally
+        self.deletes = []
+
+        #: Number of files unchanged
+        self.unchanged = 0
+
+        #: ``(remote path, response)`` of the changes failed, the response
+        #: is the exception raised if the request failed
+        self.failed = []
+
+        #: :class:`~bulk.BulkStats` of the uploads, after :meth:`run`
+        self.upload_stats = None
+
+        #: :class:`~bulk.BulkStats` of the deletes, after :meth:`run`
+        self.delete_stats = None
+
+        self._records = {}
+        self._hashed = {}
+        self._lock = threading.Lock()
+
+    def __str__(self):
+        lines = ['upload %s -> %s' % u for u in self.uploads]
+        lines.extend('delete %s' % d for d in self.deletes)
+        lines.append('%d to upload, %d to delete, %d unchanged' %
+                (len(self.uploads), len(self.deletes), self.unchanged))
+        return '\n'.join(lines)
+
+    def _upload(self, item):
+        local, remote = item
+        record = self._records.get(remote)
+        with open(local, 'rb') as f:
+            st = os.fstat(f.fileno())
+            md5 = stream.md5_file(f, chunk_size=self.client.chunk_size)
+            with self._lock:
+                self._hashed[remote] = (st.st_size, st.st_mtime, md5)
+            if record is not None and record[0] == st.st_size and \
+                    record[2] == md5:
+                # touched but not changed
+                return None
+            return self.client.put(remote, f, md5=md5)
+
+    def run(self, workers=const.DEFAULT_WORKERS):
+        """Upload and delete the files in the plan concurrently, the manifest
+        is updated as the changes are made
+
+        :param int workers: Number of worker threads
+        :returns: Whether all the changes are made
+        """
+        self._records = dict((remote, self.manifest.get(remote))
+                for _, remote in self.uploads)
+        self.client._ensure_pool_size(workers)
+
+        uploads = bulk.Bulk(self._upload, self.uploads, workers,
+                key=lambda item: item[1])
+        for remote, resp in uploads:
+            if isinstance(resp, Exception) or \
+                    (resp is not None and not resp.success):
+                self.failed.append((remote, resp))
+                continue
+            size, mtime, md5 = self._hashed.pop(remote)
+            record = self._records[remote]
+            uploaded = record[3] if resp is None else None
+            self.manifest.record(remote, size, mtime, md5, uploaded)
+        self.manifest.commit()
+        self.upload_stats = uploads.stats
+
+        deletes = bulk.Bulk(self.client.delete, self.deletes, workers)
+        for remote, resp in deletes:
+            if isinstance(resp, Exception) or (not resp.success and
+                    resp.response.status_code != 404):
+                self.failed.append((remote, resp))
+                continue
+            self.manifest.remove(remote)
+        self.manifest.commit()
+        self.delete_stats = deletes.stats
+        return not self.failed
+
+
+def _iter_local(local_dir, skip):
+    for root, dirs, files in os.walk(local_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if path not in skip:
+                yield path
+
+
+def sync(client, local_dir, remote_dir, manifest=None, delete=False,
+        dry_run=False, workers=const.DEFAULT_WORKERS):
+    """Upload the new and changed files of a local folder to a folder on the
+    server, optionally deleting the files deleted locally
+
+    The files are compared with the records of the manifest: a file whose
+    size and mtime are unchanged is skipped without being hashed, and
+    the server is never listed. A file whose mtime changed but whose
+    content did not is not uploaded again.
+
+    :param client: :class:`~upyun.UpYun` client
+    :param str local_dir: Local folder
+    :param str remote_dir: Folder on the server
+    :param manifest: :class:`Manifest` or the path of its database, default
+                     :const:`~const.SYNC_MANIFEST` inside ``local_dir``,
+                     which is not synced
+    :param bool delete: Whether to delete the files deleted locally
+    :param bool dry_run: Whether to only plan the changes
+    :param int workers: Number of worker threads
+    :rtype: :class:`SyncPlan`
+    """
+    if manifest is None:
+        manifest = os.path.join(local_dir, const.SYNC_MANIFEST)
+    if not isinstance(manifest, Manifest):
+        manifest = Manifest(manifest)
+    skip = set([manifest.path, manifest.path + '-journal'])
+
+    plan = SyncPlan(client, manifest)
+    seen = set()
+    for local in _iter_local(local_dir, skip):
+        rel = os.path.relpath(local, local_dir).replace(os.sep, '/')
+        remote = posixpath.join(remote_dir, rel)
+        seen.add(remote)
+        st = os.stat(local)
+        record = manifest.get(remote)
+        if record is not None and record[0] == st.st_size and \
+                record[1] == st.st_mtime:
+            plan.unchanged += 1
+        else:
+            plan.uploads.append((local, remote))
+    if delete:
+        plan.deletes = [p for p in manifest.paths(remote_dir)
+                if p not in seen]
+
+    if not dry_run:
+        plan.run(workers)
+    return plan
+
+
+class MirrorPlan(object):
+    """Changes to make a local folder mirror a folder on the server, made by
+    :func:`mirror`
+
+    :param client: :class:`~upyun.UpYun` client
+    """
+    def __init__(self, client):
+        self.client = client
+
+        #: ``(remote path, local path, mtime)`` of the new or changed files
+        self.downloads = []
+
+        #: Local paths of the files deleted on the server
+        self.deletes = []
+
+        #: Number of files unchanged
+        self.unchanged = 0
+
+        #: ``(remote path, response)`` of the folder listings and of the
+        #: downloads failed, the response is the exception raised if the
+        #: request failed
+        self.failed = []
+
+        #: :class:`~bulk.BulkStats` of the downloads, after :meth:`run`
+        self.download_stats = None
+
+    def __str__(self):
+        lines = ['download %s -> %s' % d[:2] for d in self.downloads]
+        lines.extend('delete %s' % d for d in self.deletes)
+        lines.append('%d to download, %d to delete, %d unchanged' %
+                (len(self.downloads), len(self.deletes), self.unchanged))
+        return '\n'.join(lines)
+
+    def _download(self, item):
+        remote, local, mtime = item
+        folder = os.path.dirname(local)
+        try:
+            os.makedirs(folder)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, tmp = tempfile.mkstemp(prefix=const.MIRROR_TEMP_PREFIX,
+                dir=folder)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                resp = self.client.get_to_file(remote, f)
+            if resp.success:
+                os.utime(tmp, (mtime, mtime))
+                if os.name == 'nt' and os.path.exists(local):
+                    os.remove(local)
+                os.rename(tmp, local)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return resp
+
+    def run(self, workers=const.DEFAULT_WORKERS):
+        """Download the files in the plan concurrently, each file is streamed
+        into a temporary file which is renamed over the local file once
+        complete, then delete the local files deleted on the server
+
+        :param int workers: Number of worker threads
+        :returns: Whether all the files are downloaded
+        """
+        self.client._ensure_pool_size(workers)
+        downloads = bulk.Bulk(self._download, self.downloads, workers,
+                key=lambda item: item[0])
+        for remote, resp in downloads:
+            if isinstance(resp, Exception) or not resp.success:
+                self.failed.append((remote, resp))
+        self.download_stats = downloads.stats
+        for local in self.deletes:
+            os.remove(local)
+        return not self.failed
+
+
+def mirror(client, remote_dir, local_dir, delete=False, dry_run=False,
+        workers=const.DEFAULT_WORKERS):
+    """Download the new and changed files of a folder on the server to a
+    local folder, optionally deleting the local files deleted on the server
+
+    The server is listed with :func:`~upyun.tree.walk`, and a file is
+    downloaded if its size or mtime differs from the local file. The mtime
+    of a downloaded file is set to the one on the server, so the next mirror
+    skips it. A folder failing to list is added to :attr:`MirrorPlan.failed`
+    and the local files below it are never deleted.
+
+    :param client: :class:`~upyun.UpYun` client
+    :param str remote_dir: Folder on the server
+    :param str local_dir: Local folder
+    :param bool delete: Whether to delete the local files which are not on
+                        the server
+    :param bool dry_run: Whether to only plan the changes
+    :param int workers: Number of worker threads
+    :rtype: :class:`MirrorPlan`
+    """
+    plan = MirrorPlan(client)
+    root = remote_dir.rstrip('/') + '/'
+    seen = set()
+    # local folders of the remote folders failed to list, their files are
+    # unknown so none of them is deleted
+    unlisted = []
+
+    def onerror(dirpath, resp):
+        plan.failed.append((dirpath, resp))
+        unlisted.append(os.path.join(local_dir,
+            *dirpath[len(root):].split('/')).rstrip(os.sep) + os.sep)
+
+    for dirpath, _, files in client.walk(remote_dir, workers=workers,
+            onerror=onerror):
+        for f in files:
+            remote = posixpath.join(dirpath, f.name.encode('utf-8'))
+            local = os.path.join(local_dir,
+                    *remote[len(root):].split('/'))
+            seen.add(local)
+            mtime = calendar.timegm(f.mtime.utctimetuple())
+            try:
+                st = os.stat(local)
+            except OSError:
+                st = None
+            if st is not None and st.st_size == f.size and \
+                    int(st.st_mtime) == mtime:
+                plan.unchanged += 1
+            else:
+                plan.downloads.append((remote, local, mtime))
+    if delete:
+        plan.deletes = [p for p in _iter_local(local_dir, seen)
+                if not os.path.basename(p).startswith(
+                    const.MIRROR_TEMP_PREFIX) and
+                not any(p.startswith(u) for u in unlisted)]
+
+    if not dry_run:
+        plan.run(workers)
+    return plan
@@ -0,0 +1,163 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.poolmanager import PoolManager
+
+from . import const
+
+# requests takes separate connect and read timeouts since 2.4
+_TIMEOUT_TUPLES = tuple(int(n) for n in
+        requests.__version__.split('.')[:2]) >= (2, 4)
+
+
+def _clip(timeout, remaining):
+    if remaining is None:
+        return timeout
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def request_timeout(timeout, remaining=None):
+    """Build the ``timeout`` argument of :meth:`requests.Session.request`
+
+    Older versions of requests apply a single timeout to the connect and to
+    every read, a ``(connect, read)`` pair is reduced to the larger of the
+    two for them.
+
+    :param timeout: Seconds, ``(connect, read)`` seconds or ``None``
+    :param float remaining: Seconds left before a deadline, the timeouts are
+                            clipped to it
+    """
+    if not isinstance(timeout, tuple):
+        return _clip(timeout, remaining)
+    connect, read = (_clip(t, remaining) for t in timeout)
+    if _TIMEOUT_TUPLES:
+        return connect, read
+    if connect is None or read is None:
+        return None
+    return max(connect, read)
+
+
+# timings of the connection used by the last request of each thread
+_timings = threading.local()
+
+
+def reset_timings():
+    """Forget the timings of the last request of the thread"""
+    _timings.connect = _timings.first_byte = None
+
+
+def last_timings():
+    """Timings of the connection used by the last request of the thread
+
+    :returns: ``(connect, first_byte)``, the seconds taken to resolve and
+              connect, :class:`None` if a kept alive connection was reused,
+              and the time the response headers arrived
+    """
+    return (getattr(_timings, 'connect', None),
+            getattr(_timings, 'first_byte', None))
+
+
+def _time_connection(conn):
+    connect, getresponse = conn.connect, conn.getresponse
+
+    def _connect():
+        start = time.time()
+        connect()
+        _timings.connect = time.time() - start
+
+    def _getresponse(*args, **kwargs):
+        r = getresponse(*args, **kwargs)
+        _timings.first_byte = time.time()
+        return r
+
+    conn.connect, conn.getresponse = _connect, _getresponse
+    return conn
+
+
+class PoolStats(object):
+    """Statistics of the connection pools of a :class:`PoolAdapter`"""
+    def __init__(self):
+        #: Number of connections taken from the pools
+        self.requests = 0
+
+        #: Number of new connections opened
+        self.new_connections = 0
+
+        #: Number of times a pool had no idle connection left, the request
+        #: waited for one if the pool blocks, or opened an extra connection
+        self.waits = 0
+
+        self._lock = threading.Lock()
+
+    @property
+    def hits(self):
+        """Number of requests reusing a kept alive connection"""
+        return max(self.requests - self.new_connections, 0)
+
+    def _instrument(self, pool):
+        get_conn, new_conn = pool._get_conn, pool._new_conn
+
+        def _get_conn(*args, **kwargs):
+            with self._lock:
+                self.requests += 1
+                if pool.pool is not None and pool.pool.empty():
+                    self.waits += 1
+            return get_conn(*args, **kwargs)
+
+        def _new_conn(*args, **kwargs):
+            with self._lock:
+                self.new_connections += 1
+            return _time_connection(new_conn(*args, **kwargs))
+
+        pool._get_conn, pool._new_conn = _get_conn, _new_conn
+
+
+class _PoolManager(PoolManager):
+    def __init__(self, stats, *args, **kwargs):
+        self.stats = stats
+        PoolManager.__init__(self, *args, **kwargs)
+
+    def _new_pool(self, *args, **kwargs):
+        pool = PoolManager._new_pool(self, *args, **kwargs)
+        self.stats._instrument(pool)
+        return pool
+
+
+class PoolAdapter(HTTPAdapter):
+    """HTTP adapter with tunable connection pools and pool statistics, one
+    adapter can be shared by several :class:`~upyun.UpYun` clients
+
+    :param int pool_connections: Number of hosts to keep a pool for
+    :param int pool_maxsize: Max connections kept alive per host
+    :param bool pool_block: Whether to wait for a free connection when all
+                            the connections to a host are in use, instead of
+                            opening an extra one, which makes ``pool_maxsize``
+                            a hard limit of connections per host
+    """
+    __attrs__ = HTTPAdapter.__attrs__ + ['pool_block', 'stats']
+
+    def __init__(self, pool_connections=const.DEFAULT_POOL_CONNECTIONS,
+            pool_maxsize=const.DEFAULT_POOL_MAXSIZE, pool_block=False):
+        self.pool_block = pool_block
+
+        #: :class:`PoolStats` of the pools
+        self.stats = PoolStats()
+
+        super(PoolAdapter, self).__init__(pool_connections, pool_maxsize)
+
+    def init_poolmanager(self, connections, maxsize, *args, **kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self.poolmanager = _PoolManager(self.stats, num_pools=connections,
+                maxsize=maxsize, block=self.pool_block)
+
+    def resize(self, maxsize):
+        """Change the max connections kept alive per host, the idle
+        connections are closed
+
+        :param int maxsize: Max connections per host
+        """
+        self.poolmanager.clear()
+        self.init_poolmanager(self._pool_connections, maxsize)
@@ -0,0 +1,159 @@
+import posixpath
+import Queue
+
+import requests
+
+from . import bulk, const
+
+
+def _in_prefixes(path, prefixes):
+    """Whether the subtree at ``path`` overlaps one of the prefixes"""
+    path = path.rstrip('/') + '/'
+    for prefix in prefixes:
+        prefix = prefix.rstrip('/') + '/'
+        if path.startswith(prefix) or prefix.startswith(path):
+            return True
+    return False
+
+
+def walk(client, path, max_depth=None, workers=const.DEFAULT_WORKERS,
+        prefixes=None, onerror=None):
+    """Walk a folder tree on the server like :func:`os.walk`, the subfolders
+    are listed concurrently in a pool of worker threads and
+    ``(dirpath, folders, files)`` is yielded for each folder as its listing
+    arrives, so the order is not deterministic
+
+    ``folders`` and ``files`` are lists of
+    :class:`~upyun.response.LsMixin.FileInfo`. The subfolders are queued
+    before the folder is yielded, so unlike :func:`os.walk` modifying
+    ``folders`` does not prune the walk, use ``max_depth`` and ``prefixes``
+    instead.
+
+    :param client: :class:`~upyun.UpYun` client
+    :param str path: Path of the top folder
+    :param int max_depth: Max depth of the folders to list, the top folder is
+                          at depth 0, ``None`` for no limit
+    :param int workers: Number of folders listed concurrently
+    :param prefixes: Paths to walk below, a subfolder is entered only if it
+                     is inside or above one of them
+    :param onerror: Function called with ``(path, response)`` when listing a
+                    folder fails, the response is the exception raised if
+                    the request failed, by default errors are ignored
+    """
+    pending = Queue.Queue()
+    pending.put((path, 0))
+    outstanding = 1
+
+    def folders_to_list():
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            yield item
+
+    client._ensure_pool_size(workers)
+    listings = bulk.Bulk(lambda item: client.ls(item[0]), folders_to_list(),
+            workers)
+    try:
+        for (dirpath, depth), resp in listings:
+            outstanding -= 1
+            if isinstance(resp, Exception) or not resp.success:
+                if onerror is not None:
+                    onerror(dirpath, resp)
+                if not outstanding:
+                    pending.put(None)
+                continue
+
+            folders, files = [], []
+            for f in resp.iter_entries():
+                if f.type == const.FILE_TYPE_FILE:
+                    files.append(f)
+                    continue
+                subpath = posixpath.join(dirpath, f.name.encode('utf-8'))
+                if prefixes is not None and \
+                        not _in_prefixes(subpath, prefixes):
+                    continue
+                folders.append(f)
+                if max_depth is None or depth < max_depth:
+                    outstanding += 1
+                    pending.put((subpath, depth + 1))
+            if not outstanding:
+                pending.put(None)
+            yield dirpath, folders, files
+    finally:
+        listings.close()
+        pending.put(None)
+
+
+def _deleted(resp):
+    """Whether a delete left the path gone, a missing path counts as
+    deleted"""
+    if isinstance(resp, Exception):
+        return False
+    return resp.success or \
+            resp.response.status_code == requests.codes.not_found
+
+
+def rmtree(client, path, workers=const.DEFAULT_WORKERS, onerror=None):
+    """Delete a folder and everything below it, the tree is walked with
+    :func:`walk` while the files found are deleted concurrently, then the
+    folders are deleted bottom-up, the folders of one depth concurrently
+
+    A folder is not deleted if something below it failed to be listed or
+    deleted, since it cannot be empty. A path already missing counts as
+    deleted. With ``path`` ``'/'`` the bucket is emptied, the root itself is
+    kept.
+
+    :param client: :class:`~upyun.UpYun` client
+    :param str path: Path of the folder
+    :param int workers: Number of requests sent concurrently
+    :param onerror: Function called with ``(path, response)`` when listing
+                    or deleting a path fails, the response is the exception
+                    raised if the request failed
+    :returns: ``(path, response)`` pairs of the failures, empty if the tree
+              is deleted
+    :rtype: :class:`list`
+    """
+    path = '/' + path.strip('/')
+    failures = []
+    # folders that cannot be empty because of a failure below them
+    blocked = set()
+    depths = {}
+
+    def fail(failed, resp):
+        failures.append((failed, resp))
+        if onerror is not None:
+            onerror(failed, resp)
+        # a folder failing to be listed is blocked as well as its parents
+        folder = failed
+        while folder not in blocked and len(folder) >= len(path):
+            blocked.add(folder)
+            folder = posixpath.dirname(folder)
+
+    def unlisted(folder, resp):
+        # a folder already missing has nothing left to delete
+        if not _deleted(resp):
+            fail(folder, resp)
+
+    base = path.rstrip('/')
+
+    def files():
+        for dirpath, _, entries in walk(client, path, workers=workers,
+                onerror=unlisted):
+            depth = 0 if dirpath == path else \
+                    dirpath[len(base):].count('/')
+            depths.setdefault(depth, []).append(dirpath)
+            for f in entries:
+                yield posixpath.join(dirpath, f.name.encode('utf-8'))
+
+    def delete(paths):
+        for deleted, resp in client.delete_many(paths, workers):
+            if not _deleted(resp):
+                fail(deleted, resp)
+
+    delete(files())
+    for depth in sorted(depths, reverse=True):
+        # the bucket itself is emptied, not deleted
+        delete(folder for folder in depths[depth]
+                if folder not in blocked and folder != '/')
+    return failures